@@ -0,0 +1,25 @@
+from hashlib import blake2b
+from typing import Iterator
+
+
+class BloomFilter:
+    def __init__(self, data: bytes, size: int, hashes: int):
+        self.bits = bytearray(data) if len(data) > 0 else bytearray(size)
+        self.hashes = hashes
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(key))
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.bits)
+
+    def add(self, key: bytes):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def positions(self, key: bytes) -> Iterator[int]:
+        digest = blake2b(key, digest_size=4 * self.hashes).digest()
+        bit_count = len(self.bits) * 8
+
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[4 * i : 4 * i + 4], "little") % bit_count
@@ -12,7 +12,12 @@ from google.protobuf.message import Message
 from core.storages import get_image_url
 from protos import image_pb2
 
-from .signals import post_soft_delete, pre_soft_delete
+from .signals import (
+    post_bulk_soft_delete,
+    post_soft_delete,
+    pre_bulk_soft_delete,
+    pre_soft_delete,
+)
 
 
 class MessageConvertible:
@@ -110,6 +115,16 @@ class SoftDeleteModel(models.Model, MessageConvertible):
         self.is_deleted = True
         self.save()
 
+    @classmethod
+    def bulk_soft_delete(cls, pks: list[Any]):
+        pre_bulk_soft_delete.send(sender=cls, pks=pks)
+        cls.perform_bulk_soft_delete(pks)
+        post_bulk_soft_delete.send(sender=cls, pks=pks)
+
+    @classmethod
+    def perform_bulk_soft_delete(cls, pks: list[Any]):
+        cls.objects.filter(pk__in=pks).update(is_deleted=True)
+
 
 class ExistingManager(models.Manager):
     def get_queryset(self) -> models.QuerySet:
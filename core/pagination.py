@@ -58,6 +58,9 @@ class PaginationAdapter(ABC):
             for field in self.get_cursor_fields()
         ]
 
+    def prepare_items(self, items: list[Model]):
+        pass
+
     def make_message(self, item: Model, **overrides) -> Message:
         if isinstance(item, MessageConvertible):
             return item.to_message(context=self.context, **overrides)
@@ -174,6 +177,7 @@ class PaginatorMixin:
         if on_items:
             on_items(items)
 
+        adapter.prepare_items(items)
         return bundle_class(
             **{
                 bundle_field: [
@@ -200,11 +204,12 @@ class PaginatorMixin:
             items = items.reverse()
 
         count = items.count()
-        items = items.select_related()[page.offset : page.offset + size]
+        items = list(items.select_related()[page.offset : page.offset + size])
 
         if on_items:
             on_items(items)
 
+        adapter.prepare_items(items)
         return bundle_class(
             **{
                 bundle_field: [
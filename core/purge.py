@@ -0,0 +1,72 @@
+from datetime import timedelta
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.transaction import atomic
+
+PURGE_CHUNK_SIZE = 500
+
+PURGE_CHECKPOINT_DURATION = timedelta(days=1)
+
+
+def purge_key(name: str) -> str:
+    return f"{settings.APP_NAME}:purge:{name}"
+
+
+def purge_progress(name: str) -> Optional[dict[str, Any]]:
+    return cache.get(purge_key(name))
+
+
+def purge(
+    name: str,
+    queryset: models.QuerySet,
+    action: Callable[[list[Any]], Any],
+    chunk_size: int = PURGE_CHUNK_SIZE,
+) -> int:
+    key = purge_key(name)
+    progress = cache.get(key) or {"last_pk": None, "count": 0}
+    queryset = queryset.order_by("pk")
+
+    while True:
+        chunk = queryset
+
+        if progress["last_pk"] is not None:
+            chunk = chunk.filter(pk__gt=progress["last_pk"])
+
+        with atomic():
+            pks = list(chunk.values_list("pk", flat=True)[:chunk_size])
+
+            if not pks:
+                break
+
+            action(pks)
+
+        progress = {"last_pk": pks[-1], "count": progress["count"] + len(pks)}
+        cache.set(key, progress, PURGE_CHECKPOINT_DURATION.total_seconds())
+
+    cache.delete(key)
+    return progress["count"]
+
+
+def purge_delete(
+    name: str, queryset: models.QuerySet, chunk_size: int = PURGE_CHUNK_SIZE
+) -> int:
+    return purge(
+        name,
+        queryset,
+        lambda pks: queryset.model.objects.filter(pk__in=pks).delete(),
+        chunk_size=chunk_size,
+    )
+
+
+def purge_soft_delete(
+    name: str, queryset: models.QuerySet, chunk_size: int = PURGE_CHUNK_SIZE
+) -> int:
+    return purge(
+        name,
+        queryset.filter(is_deleted=False),
+        queryset.model.bulk_soft_delete,
+        chunk_size=chunk_size,
+    )
@@ -315,16 +315,35 @@ CELERY_BEAT_SCHEDULE = {
         "task": "users.tasks.cleanup_connections",
         "schedule": crontab(hour=0, minute=0),
     },
+    "posts.flush_post_life": {
+        "task": "posts.tasks.flush_post_life",
+        "schedule": crontab(),
+    },
     "posts.cleanup_stacks": {
         "task": "posts.tasks.cleanup_stacks",
         "schedule": crontab(minute=0),
     },
-    "notifications.refresh_apns_token": {
-        "task": "notifications.tasks.refresh_apns_token",
-        "schedule": crontab(minute="0,30"),
+    "posts.cleanup_expired_posts": {
+        "task": "posts.tasks.cleanup_expired_posts",
+        "schedule": crontab(minute=30),
     },
 }
 
+# Redis
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+CACHES = {
+    "default": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+        if REDIS_URL
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    )
+}
+
 # Apple Push Notification Serivce
 
 APPLE_TEAM_ID = os.getenv("APPLE_TEAM_ID")
@@ -361,6 +380,28 @@ FYREPLACE_POST_SPREAD_LIFE = 3
 
 FYREPLACE_POST_MAX_DURATION = timedelta(weeks=1)
 
+FYREPLACE_CANDIDATE_POOL = (
+    "posts.pools.RedisCandidatePool" if REDIS_URL else "posts.pools.LocalCandidatePool"
+)
+
+FYREPLACE_CANDIDATE_POOL_REFRESH = timedelta(minutes=5)
+
+FYREPLACE_ANONYMOUS_FEED_SIZE = 100
+
+FYREPLACE_ANONYMOUS_FEED_REFRESH = timedelta(seconds=30)
+
+FYREPLACE_FEED_PREFETCH_WORKERS = MAX_CONCURRENCY
+
+FYREPLACE_VOTE_BATCH_SIZE = 10
+
+FYREPLACE_VOTED_FILTER_SIZE = 4096
+
+FYREPLACE_VOTED_FILTER_HASHES = 5
+
+FYREPLACE_ACKNOWLEDGEMENT_DEBOUNCE = timedelta(seconds=5)
+
+FYREPLACE_NOTIFICATION_COUNT_DURATION = timedelta(hours=1)
+
 # Other
 
 PAGINATION_MAX_SIZE = 50
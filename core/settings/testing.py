@@ -18,3 +18,7 @@ APNS_PRIVATE_KEY = None
 FIREBASE_APP = None
 
 GRAVATAR_BASE_URL = None
+
+FYREPLACE_CANDIDATE_POOL = "posts.pools.LocalCandidatePool"
+
+FYREPLACE_FEED_PREFETCH_WORKERS = 0
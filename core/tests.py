@@ -5,6 +5,7 @@ import grpc
 import pytest
 from django.conf import settings
 from django.core import mail
+from django.core.cache import cache
 from django.db.models.query import QuerySet
 from django.test.testcases import TestCase
 from google.protobuf import empty_pb2
@@ -49,6 +50,7 @@ class PytestTestRunner:
 
 class BaseTestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.grpc_context = FakeContext()
         self.request = empty_pb2.Empty()
 
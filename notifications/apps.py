@@ -8,4 +8,4 @@ class NotificationsConfig(AppConfig):
 
     def ready(self):
         super().ready()
-        from . import signals
+        from . import checks, signals
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs) -> list[Error]:
+    if settings.DEBUG or settings.IS_TESTING:
+        return []
+
+    if isinstance(caches["default"], LocMemCache):
+        return [
+            Error(
+                "Notification counts and push fan-out progress need a cache "
+                "shared between processes.",
+                hint="Set REDIS_URL.",
+                id="notifications.E001",
+            )
+        ]
+
+    return []
@@ -0,0 +1,97 @@
+from django.apps.registry import Apps
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.models.functions import Cast, Concat, Lower, Replace, Substr
+
+MODEL_NAMES = ["Notification", "Flag"]
+HEX_GROUPS = [(1, 8), (9, 4), (13, 4), (17, 4), (21, 12)]
+
+
+def copy_target_uuids(apps: Apps, schema_editor: BaseDatabaseSchemaEditor):
+    if schema_editor.connection.features.has_native_uuid_field:
+        target_uuid = Cast("target_id", models.UUIDField())
+    else:
+        target_uuid = Replace(Lower("target_id"), models.Value("-"))
+
+    for model_name in MODEL_NAMES:
+        apps.get_model("notifications", model_name).objects.update(
+            target_uuid=target_uuid
+        )
+
+
+def copy_target_ids(apps: Apps, schema_editor: BaseDatabaseSchemaEditor):
+    if schema_editor.connection.features.has_native_uuid_field:
+        target_id = Cast("target_uuid", models.CharField())
+    else:
+        groups = [Substr("target_uuid", *group) for group in HEX_GROUPS]
+        target_id = Concat(
+            groups[0],
+            *(part for group in groups[1:] for part in (models.Value("-"), group)),
+            output_field=models.CharField(),
+        )
+
+    for model_name in MODEL_NAMES:
+        apps.get_model("notifications", model_name).objects.update(target_id=target_id)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("notifications", "0006_apnstoken_remotemessaging"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="target_uuid",
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name="flag",
+            name="target_uuid",
+            field=models.UUIDField(null=True),
+        ),
+        migrations.RunPython(copy_target_uuids, copy_target_ids),
+        migrations.AlterUniqueTogether(name="notification", unique_together=set()),
+        migrations.AlterUniqueTogether(name="flag", unique_together=set()),
+        migrations.RemoveField(model_name="notification", name="target_id"),
+        migrations.RemoveField(model_name="flag", name="target_id"),
+        migrations.RenameField(
+            model_name="notification", old_name="target_uuid", new_name="target_id"
+        ),
+        migrations.RenameField(
+            model_name="flag", old_name="target_uuid", new_name="target_id"
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="target_id",
+            field=models.UUIDField(),
+        ),
+        migrations.AlterField(
+            model_name="flag",
+            name="target_id",
+            field=models.UUIDField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name="notification",
+            unique_together={("subscription", "target_type", "target_id")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="flag",
+            unique_together={("issuer", "target_type", "target_id")},
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["target_type", "target_id"],
+                name="notifications_target_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flag",
+            index=models.Index(
+                fields=["target_type", "target_id"],
+                name="notifications_flag_target_idx",
+            ),
+        ),
+    ]
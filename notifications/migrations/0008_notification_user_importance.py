@@ -0,0 +1,51 @@
+import django.db.models.deletion
+from django.apps.registry import Apps
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_readable_columns(apps: Apps, *args, **kwargs):
+    Notification = apps.get_model("notifications", "Notification")
+    Subscription = apps.get_model("posts", "Subscription")
+    Notification.objects.filter(subscription__isnull=True).update(importance=1)
+    Notification.objects.filter(subscription__isnull=False).update(
+        user_id=models.Subquery(
+            Subscription.objects.filter(id=models.OuterRef("subscription_id")).values(
+                "user_id"
+            )[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("posts", "0010_post_posts_post_active_idx_and_more"),
+        ("notifications", "0007_notification_flag_target_uuid"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="user",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="importance",
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_readable_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "importance", "date_updated", "id"],
+                name="notifications_readable_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.apps.registry import Apps
+from django.db import migrations
+
+
+def delete_refresh_task(apps: Apps, *args, **kwargs):
+    try:
+        PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    except LookupError:
+        return
+
+    PeriodicTask.objects.filter(task="notifications.tasks.refresh_apns_token").delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notifications", "0008_notification_user_importance"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="ApnsToken",
+        ),
+        migrations.RunPython(delete_refresh_task, migrations.RunPython.noop),
+    ]
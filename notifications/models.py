@@ -1,44 +1,106 @@
-import uuid
+from typing import Any, Iterable
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db import models
-from django.db.models import Case, Sum, When
+from django.db.models import Sum
+from django.db.transaction import on_commit
 from django.utils.translation import gettext as _
 
-from core.models import MessageConvertible, TimestampModel, UUIDModel
+from core.models import MessageConvertible, UUIDModel
 from posts.models import Comment, Subscription
 from protos import notification_pb2
 from users.models import Connection
 
 
-def count_notifications_for(user: AbstractUser):
+def count_notifications_for(user: AbstractUser) -> int:
+    return count_notifications_for_users([user])[user.id]
+
+
+def count_notifications_for_users(users: Iterable[AbstractUser]) -> dict[Any, int]:
+    users = list(users)
+    timeout = settings.FYREPLACE_NOTIFICATION_COUNT_DURATION.total_seconds()
+    keys = {user.id: notification_count_key(user.id) for user in users}
+    flags_key = notification_count_key("flags")
+    counts = cache.get_many([*keys.values(), flags_key])
+
+    if missing := [user_id for user_id, key in keys.items() if key not in counts]:
+        recounts = dict(
+            Notification.objects.filter(user_id__in=missing)
+            .order_by()
+            .values("user_id")
+            .annotate(total_count=Sum("count"))
+            .values_list("user_id", "total_count")
+        )
+        recounts = {keys[user_id]: recounts.get(user_id, 0) for user_id in missing}
+        cache.set_many(recounts, timeout)
+        counts.update(recounts)
+
+    if flags_key not in counts and any(user.is_staff for user in users):
+        counts[flags_key] = recount_notifications(user__isnull=True)
+        cache.set(flags_key, counts[flags_key], timeout)
+
+    return {
+        user.id: counts[keys[user.id]] + (counts[flags_key] if user.is_staff else 0)
+        for user in users
+    }
+
+
+def recount_notifications(**kwargs) -> int:
     return (
-        Notification.objects.filter_readable_by(user)
+        Notification.objects.filter(**kwargs)
         .aggregate(total_count=Sum("count"))
         .get("total_count")
         or 0
     )
 
 
+def notification_count_key(user_id: Any) -> str:
+    return f"{settings.APP_NAME}:notifications:count:{user_id}"
+
+
+def invalidate_notification_counts(user_ids: Iterable[Any], flags: bool = False):
+    keys = [notification_count_key(user_id) for user_id in user_ids]
+
+    if flags:
+        keys.append(notification_count_key("flags"))
+
+    if keys:
+        cache.delete_many(keys)
+        on_commit(lambda: cache.delete_many(keys))
+
+
 def remove_notifications_for(instance: models.Model):
-    target_type = ContentType.objects.get_for_model(type(instance))
-    Notification.objects.filter(target_type=target_type, target_id=instance.id).delete()
-    Flag.objects.filter(target_type=target_type, target_id=instance.id).delete()
+    remove_notifications_for_pks(type(instance), [instance.pk])
+
+
+def remove_notifications_for_pks(model: type[models.Model], pks: list[Any]):
+    target_type = ContentType.objects.get_for_model(model)
+    notifications = Notification.objects.filter(
+        target_type=target_type, target_id__in=pks
+    )
+    invalidate_notification_counts(
+        notifications.filter(user__isnull=False)
+        .values_list("user_id", flat=True)
+        .distinct(),
+        flags=True,
+    )
+    notifications.delete()
+    Flag.objects.filter(target_type=target_type, target_id__in=pks).delete()
 
 
 class NotificationQuerySet(models.QuerySet):
     def filter_readable_by(self, user: AbstractUser, *args, **kwargs):
         return (
             self.filter(
-                models.Q(subscription__isnull=True) | models.Q(subscription__user=user),
-                *args,
-                **kwargs,
+                models.Q(user__isnull=True) | models.Q(user=user), *args, **kwargs
             )
             if user.is_staff
-            else self.filter(*args, subscription__user=user, **kwargs)
+            else self.filter(*args, user=user, **kwargs)
         )
 
 
@@ -47,8 +109,7 @@ class NotificationsManager(models.Manager):
         return NotificationQuerySet(self.model).annotate(
             is_flag=models.ExpressionWrapper(
                 models.Q(subscription__isnull=True), output_field=models.BooleanField()
-            ),
-            importance=Case(When(subscription__isnull=True, then=1), default=0),
+            )
         )
 
     def filter_readable_by(self, user: AbstractUser, *args, **kwargs):
@@ -64,6 +125,15 @@ class Notification(UUIDModel, MessageConvertible):
     class Meta:
         unique_together = ["subscription", "target_type", "target_id"]
         ordering = ["date_updated", "id"]
+        indexes = [
+            models.Index(
+                fields=["target_type", "target_id"], name="notifications_target_idx"
+            ),
+            models.Index(
+                fields=["user", "importance", "date_updated", "id"],
+                name="notifications_readable_idx",
+            ),
+        ]
 
     objects = NotificationsManager()
     flag_objects = FlagsManager()
@@ -75,12 +145,16 @@ class Notification(UUIDModel, MessageConvertible):
         related_name="+",
         null=True,
     )
+    user = models.ForeignKey(
+        to=get_user_model(), on_delete=models.CASCADE, related_name="+", null=True
+    )
     target_type = models.ForeignKey(
         ContentType, on_delete=models.CASCADE, related_name="+"
     )
-    target_id = models.CharField(max_length=len(str(uuid.uuid4())))
+    target_id = models.UUIDField()
     target = GenericForeignKey("target_type", "target_id")
     count = models.IntegerField(default=0)
+    importance = models.SmallIntegerField(default=0)
     date_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
@@ -88,6 +162,10 @@ class Notification(UUIDModel, MessageConvertible):
 
     def save(self, *args, **kwargs):
         if subscription := self.subscription:
+            self.user_id = subscription.user_id
+            self.importance = 0
+            invalidate_notification_counts([subscription.user_id])
+
             if comment := subscription.last_comment_seen:
                 self.count = comment.count(after=True, count_deleted=False)
             else:
@@ -95,6 +173,9 @@ class Notification(UUIDModel, MessageConvertible):
                     post_id=subscription.post_id
                 ).count()
         else:
+            self.user_id = None
+            self.importance = 1
+            invalidate_notification_counts([], flags=True)
             self.count = Flag.objects.filter(
                 target_type=self.target_type, target_id=self.target_id
             ).count()
@@ -124,6 +205,12 @@ class Notification(UUIDModel, MessageConvertible):
 class Flag(UUIDModel):
     class Meta:
         unique_together = ["issuer", "target_type", "target_id"]
+        indexes = [
+            models.Index(
+                fields=["target_type", "target_id"],
+                name="notifications_flag_target_idx",
+            )
+        ]
 
     issuer = models.ForeignKey(
         to=get_user_model(), on_delete=models.CASCADE, related_name="+"
@@ -131,7 +218,7 @@ class Flag(UUIDModel):
     target_type = models.ForeignKey(
         ContentType, on_delete=models.CASCADE, related_name="+"
     )
-    target_id = models.CharField(max_length=len(str(uuid.uuid4())))
+    target_id = models.UUIDField()
     target = GenericForeignKey("target_type", "target_id")
 
     def __str__(self) -> str:
@@ -152,13 +239,3 @@ class RemoteMessaging(UUIDModel):
 
     def __str__(self) -> str:
         return self.token
-
-
-class ApnsToken(UUIDModel, TimestampModel):
-    class Meta:
-        ordering = ["date_created", "id"]
-
-    token = models.CharField(max_length=300)
-
-    def __str__(self) -> str:
-        return self.token
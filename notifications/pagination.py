@@ -1,8 +1,40 @@
+from collections import defaultdict
 from typing import Iterable
 
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Model, QuerySet
+
 from core.pagination import PaginationAdapter
+from posts.models import Comment, Post
 
 
 class NotificationPaginationAdapter(PaginationAdapter):
     def get_cursor_fields(self) -> Iterable[str]:
         return ["importance", "date_updated", "id"]
+
+    def prepare_items(self, items: list[Model]):
+        if self.context.caller:
+            self.context.caller.prefetch_blocked_users()
+
+        notifications_by_type = defaultdict(list)
+
+        for notification in items:
+            notifications_by_type[notification.target_type_id].append(notification)
+
+        for target_type_id, notifications in notifications_by_type.items():
+            model = ContentType.objects.get_for_id(target_type_id).model_class()
+            targets = self.get_targets(model).in_bulk(
+                [n.target_id for n in notifications]
+            )
+
+            for notification in notifications:
+                if target := targets.get(notification.target_id):
+                    notification.target = target
+
+    def get_targets(self, model: type[Model]) -> QuerySet:
+        if model is Post:
+            return Post.prefetch_messages(Post.objects.all(), self.context.caller)
+        elif model is Comment:
+            return Comment.objects.select_related("author")
+        else:
+            return model._default_manager.all()
@@ -1,7 +1,22 @@
 from base64 import urlsafe_b64encode
-from typing import Union
+from datetime import timedelta
+from itertools import batched
+from typing import Any, Iterable, Optional, Union
 from uuid import UUID
 
+import rollbar
+from celery import Task, shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from posts.models import Comment
+
+FAN_OUT_PARTITION_SIZE = 500
+
+FAN_OUT_DURATION = timedelta(hours=1)
+
+FAN_OUT_MAX_ATTEMPTS = 5
+
 
 def b64encode(data: Union[bytes, UUID], padding: bool = False) -> str:
     encoded_data = urlsafe_b64encode(
@@ -12,3 +27,86 @@ def b64encode(data: Union[bytes, UUID], padding: bool = False) -> str:
 
 def cut_text(text: str) -> str:
     return text[:249] + "\u2026" if len(text) > 250 else text
+
+
+def partition_ids(
+    ids: Iterable[Any], size: int = FAN_OUT_PARTITION_SIZE
+) -> list[list[str]]:
+    return [list(partition) for partition in batched(sorted(map(str, ids)), size)]
+
+
+def comment_change_command(comment: Comment) -> str:
+    return "comment:" + ("deletion" if comment.is_deleted else "creation")
+
+
+def report_send_errors(errors: Iterable[Exception]):
+    for error in errors:
+        rollbar.report_exc_info(
+            (type(error), error, error.__traceback__), level="warning"
+        )
+
+
+def fan_out_key(name: str, comment_id: str) -> str:
+    return f"{settings.APP_NAME}:fan_out:{name}:{comment_id}"
+
+
+def fan_out_progress(name: str, comment_id: str) -> Optional[int]:
+    return cache.get(fan_out_key(name, comment_id))
+
+
+def start_fan_out(name: str, comment_id: str, partition_count: int):
+    cache.set(
+        fan_out_key(name, comment_id),
+        partition_count,
+        2 * FAN_OUT_DURATION.total_seconds(),
+    )
+
+
+def watch_fan_out(name: str, comment_id: str):
+    check_fan_out.apply_async(
+        kwargs={"name": name, "comment_id": comment_id},
+        countdown=FAN_OUT_DURATION.total_seconds(),
+    )
+
+
+@shared_task
+def check_fan_out(name: str, comment_id: str):
+    if remaining := fan_out_progress(name, comment_id):
+        rollbar.report_message(
+            f"{name} fan-out for comment {comment_id} "
+            f"expired with {remaining} partitions outstanding",
+            level="error",
+        )
+        cache.delete(fan_out_key(name, comment_id))
+
+
+def continue_partition(
+    name: str, task: Task, kwargs: dict, failures: dict[Any, Exception]
+):
+    attempt = kwargs["attempt"] + 1
+
+    if failures and attempt < FAN_OUT_MAX_ATTEMPTS:
+        task.apply_async(
+            kwargs={
+                **kwargs,
+                "user_ids": sorted(str(user_id) for user_id in failures),
+                "attempt": attempt,
+            },
+            countdown=2**attempt,
+        )
+        return
+
+    report_send_errors(failures.values())
+    finish_partition(name, kwargs["comment_id"])
+
+
+def finish_partition(name: str, comment_id: str):
+    key = fan_out_key(name, comment_id)
+
+    try:
+        remaining = cache.decr(key)
+    except ValueError:
+        return
+
+    if remaining <= 0:
+        cache.delete(key)
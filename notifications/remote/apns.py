@@ -1,7 +1,10 @@
-from datetime import timedelta
-from http.client import GONE, NOT_FOUND
+import asyncio
+from datetime import datetime, timedelta
+from http.client import GONE, INTERNAL_SERVER_ERROR, NOT_FOUND, TOO_MANY_REQUESTS
+from itertools import batched
 from math import floor
-from typing import Iterable, Optional
+from threading import Lock, Thread
+from typing import Any, Coroutine, Iterable, Optional, Union
 from urllib.parse import urljoin
 
 import jwt
@@ -10,37 +13,104 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import QuerySet
 from django.utils.timezone import now
 from google.protobuf.json_format import MessageToDict
-from httpx import Client, ReadTimeout
+from httpx import AsyncClient, HTTPStatusError, Limits, Response, TransportError
 
 from posts.models import Comment
-from users.models import Block, Connection
+from users.models import Block
 
 from ..models import (
-    ApnsToken,
     MessagingService,
     RemoteMessaging,
-    count_notifications_for,
+    count_notifications_for_users,
 )
-from . import b64encode, cut_text
+from . import (
+    FAN_OUT_PARTITION_SIZE,
+    b64encode,
+    comment_change_command,
+    continue_partition,
+    cut_text,
+    partition_ids,
+    report_send_errors,
+    start_fan_out,
+    watch_fan_out,
+)
+
+APNS_CONCURRENCY = 100
+
+APNS_CONNECTIONS = 4
 
+APNS_TOKEN_DURATION = timedelta(minutes=40)
 
-@shared_task(autoretry_for=[ObjectDoesNotExist, ReadTimeout], retry_backoff=True)
+
+@shared_task(autoretry_for=[ObjectDoesNotExist], retry_backoff=True)
 def send_remote_notifications_comment_change(comment_id: str):
-    comment = Comment.objects.get(id=comment_id)
-    users = comment.post.subscribers.exclude(id=comment.author_id)
-
-    for cursor in range(0, users.count(), 500):
-        chunk = users[cursor : cursor + 500]
-        send_message(
-            comment,
-            filter_users(comment, chunk),
-            "comment:" + ("deletion" if comment.is_deleted else "creation"),
+    comment = Comment.objects.select_related("author", "post").get(id=comment_id)
+    dispatch_comment_change(
+        comment,
+        partition_ids(
+            comment.post.subscribers.exclude(id=comment.author_id).values_list(
+                "id", flat=True
+            )
+        ),
+    )
+
+
+def dispatch_comment_change(comment: Comment, partitions: list[list[str]]):
+    command = comment_change_command(comment)
+    json = make_json(make_payload(comment, command), comment)
+    start_fan_out("apns", str(comment.id), len(partitions))
+
+    for user_ids in partitions:
+        send_remote_notifications_comment_change_partition.delay(
+            comment_id=str(comment.id),
+            author_id=str(comment.author_id),
+            post_author_id=str(comment.post.author_id),
+            command=command,
+            json=json,
+            user_ids=user_ids,
         )
 
+    watch_fan_out("apns", str(comment.id))
+
 
-@shared_task(autoretry_for=[ObjectDoesNotExist, ReadTimeout], retry_backoff=True)
+@shared_task
+def send_remote_notifications_comment_change_partition(
+    comment_id: str,
+    author_id: str,
+    post_author_id: str,
+    command: str,
+    json: dict,
+    user_ids: list[str],
+    attempt: int = 0,
+):
+    continue_partition(
+        "apns",
+        send_remote_notifications_comment_change_partition,
+        {
+            "comment_id": comment_id,
+            "author_id": author_id,
+            "post_author_id": post_author_id,
+            "command": command,
+            "json": json,
+            "user_ids": user_ids,
+            "attempt": attempt,
+        },
+        send_json(
+            json,
+            command,
+            filter_users(author_id, get_user_model().objects.filter(id__in=user_ids)),
+            post_author_id,
+        ),
+    )
+
+
+@shared_task(
+    autoretry_for=[ObjectDoesNotExist, TransportError, HTTPStatusError],
+    retry_backoff=True,
+)
 def send_remote_notifications_comment_acknowledgement(comment_id: str, user_id: str):
     comment = Comment.objects.get(id=comment_id)
 
@@ -52,7 +122,7 @@ def send_remote_notifications_comment_acknowledgement(comment_id: str, user_id:
     )
 
 
-@shared_task(autoretry_for=[ReadTimeout], retry_backoff=True)
+@shared_task(autoretry_for=[TransportError, HTTPStatusError], retry_backoff=True)
 def send_remote_notifications_clear(user_id: str):
     send_message(
         None, [get_user_model().objects.get(id=user_id)], "notifications:clear"
@@ -60,28 +130,212 @@ def send_remote_notifications_clear(user_id: str):
 
 
 def send_message(
-    comment: Optional[Comment], users: Iterable[AbstractUser], command: str
+    comment: Optional[Comment],
+    users: Iterable[AbstractUser],
+    command: str,
+    concurrency: int = APNS_CONCURRENCY,
 ):
+    if failures := send_json(
+        make_json(make_payload(comment, command), comment),
+        command,
+        users,
+        str(comment.post.author_id) if comment else None,
+        concurrency,
+    ):
+        raise next(iter(failures.values()))
+
+
+def send_json(
+    json: dict,
+    command: str,
+    users: Iterable[AbstractUser],
+    post_author_id: Optional[str],
+    concurrency: int = APNS_CONCURRENCY,
+) -> dict[Any, Exception]:
+    failures = {}
+
     if not settings.APNS_PRIVATE_KEY:
-        return
+        return failures
+
+    headers = make_headers(command)
+
+    for chunk in batched(users, FAN_OUT_PARTITION_SIZE):
+        messages = prepare_messages(post_author_id, chunk, json)
 
-    payload = make_payload(comment, command)
-
-    with Client(http2=True, headers=make_headers(command)) as client:
-        for user in users:
-            for remote_messaging in RemoteMessaging.objects.filter(
-                service=MessagingService.APNS,
-                connection__in=Connection.objects.filter(user=user),
-            ):
-                response = client.post(
-                    make_url(remote_messaging.token),
-                    json=make_json(payload, comment, user),
+        if not messages:
+            continue
+
+        responses = run_messages(
+            headers,
+            [
+                (make_url(remote_messaging.token), recipient_json)
+                for remote_messaging, recipient_json in messages
+            ],
+            concurrency,
+        )
+        stale_ids = []
+        errors = []
+
+        for (remote_messaging, _), response in zip(messages, responses):
+            if isinstance(response, Exception):
+                failures[remote_messaging.connection.user_id] = response
+            elif response.status_code in (NOT_FOUND, GONE):
+                stale_ids.append(remote_messaging.id)
+            elif response.is_error:
+                error = HTTPStatusError(
+                    f"{response.status_code} {response.text}",
+                    request=response.request,
+                    response=response,
                 )
 
-                if response.status_code in (NOT_FOUND, GONE):
-                    remote_messaging.delete()
+                if is_retryable(response):
+                    failures[remote_messaging.connection.user_id] = error
                 else:
-                    response.raise_for_status()
+                    errors.append(error)
+
+        RemoteMessaging.objects.filter(id__in=stale_ids).delete()
+        report_send_errors(errors)
+
+    return failures
+
+
+def is_retryable(response: Response) -> bool:
+    return (
+        response.status_code == TOO_MANY_REQUESTS
+        or response.status_code >= INTERNAL_SERVER_ERROR
+    )
+
+
+def prepare_messages(
+    post_author_id: Optional[str], users: Iterable[AbstractUser], json: dict
+) -> list[tuple[RemoteMessaging, dict]]:
+    users = {user.id: user for user in users}
+    remote_messagings = list(
+        RemoteMessaging.objects.filter(
+            service=MessagingService.APNS, connection__user_id__in=users
+        ).select_related("connection")
+    )
+    recipients = [
+        users[user_id]
+        for user_id in {
+            remote_messaging.connection.user_id
+            for remote_messaging in remote_messagings
+        }
+    ]
+    badges = count_notifications_for_users(recipients)
+    jsons = {
+        user.id: make_recipient_json(json, post_author_id, user, badges[user.id])
+        for user in recipients
+    }
+    return [
+        (remote_messaging, jsons[remote_messaging.connection.user_id])
+        for remote_messaging in remote_messagings
+    ]
+
+
+class ApnsClient:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.client = self.run(open_async_client())
+
+    def run(self, coroutine: Coroutine) -> Any:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class ProviderToken:
+    def __init__(self, duration: timedelta):
+        self.duration = duration
+        self.lock = Lock()
+        self.value: Optional[str] = None
+        self.date_issued: Optional[datetime] = None
+
+    def get(self) -> str:
+        with self.lock:
+            if self.value is None or now() - self.date_issued >= self.duration:
+                self.value = make_jwt()
+                self.date_issued = now()
+
+            return self.value
+
+
+client: Optional[ApnsClient] = None
+
+client_lock = Lock()
+
+reuse_client = False
+
+provider_token = ProviderToken(APNS_TOKEN_DURATION)
+
+
+def open_client() -> ApnsClient:
+    global client
+
+    with client_lock:
+        if client is None:
+            client = ApnsClient()
+
+        return client
+
+
+def close_client():
+    global client
+
+    with client_lock:
+        if client is not None:
+            client.close()
+            client = None
+
+
+async def open_async_client() -> AsyncClient:
+    return AsyncClient(
+        http1=False,
+        http2=True,
+        limits=Limits(
+            max_connections=APNS_CONNECTIONS,
+            max_keepalive_connections=APNS_CONNECTIONS,
+        ),
+    )
+
+
+def run_messages(
+    headers: dict, messages: list[tuple[str, dict]], concurrency: int
+) -> list[Union[Response, Exception]]:
+    if reuse_client:
+        persistent_client = open_client()
+        return persistent_client.run(
+            post_messages(persistent_client.client, headers, messages, concurrency)
+        )
+
+    async def run() -> list[Union[Response, Exception]]:
+        async with await open_async_client() as async_client:
+            return await post_messages(async_client, headers, messages, concurrency)
+
+    return asyncio.run(run())
+
+
+async def post_messages(
+    async_client: AsyncClient,
+    headers: dict,
+    messages: list[tuple[str, dict]],
+    concurrency: int = APNS_CONCURRENCY,
+) -> list[Union[Response, Exception]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(url: str, json: dict) -> Response:
+        async with semaphore:
+            return await async_client.post(url, json=json, headers=headers)
+
+    return await asyncio.gather(
+        *(post(url, json) for url, json in messages), return_exceptions=True
+    )
 
 
 def make_jwt() -> str:
@@ -106,7 +360,7 @@ def make_jwt() -> str:
 def make_headers(command: str) -> dict:
     future = now() + timedelta(weeks=1)
     headers = {
-        "authorization": f"bearer {ApnsToken.objects.last().token}",
+        "authorization": f"bearer {provider_token.get()}",
         "apns-push-type": "alert" if command == "comment:creation" else "background",
         "apns-expiration": str(round(future.timestamp())),
         "apns-topic": settings.APPLE_APP_ID,
@@ -129,38 +383,39 @@ def make_payload(comment: Optional[Comment], command: str) -> dict:
     return payload
 
 
-def make_json(payload: dict, comment: Optional[Comment], user: AbstractUser) -> dict:
+def make_json(payload: dict, comment: Optional[Comment]) -> dict:
     is_silent = payload["_command"] != "comment:creation"
-    badge = count_notifications_for(user)
-    relevance_score = float(user.id == comment.post.author_id) if comment else None
-    json = {
+    return {
         "aps": (
             {"content-available": 1}
             if is_silent
             else {
-                "badge": badge,
                 "alert": {
                     "title": comment.author.username,
                     "body": cut_text(comment.text),
                 },
                 "thread-id": b64encode(comment.post_id),
-                "relevance-score": relevance_score,
             }
         ),
         **payload,
     }
 
-    if is_silent:
-        json = {**json, "_aps.badge": badge, "_aps.relevance-score": relevance_score}
 
-    return json
+def make_recipient_json(
+    json: dict, post_author_id: Optional[str], user: AbstractUser, badge: int
+) -> dict:
+    relevance_score = float(str(user.id) == post_author_id) if post_author_id else None
 
+    if "content-available" in json["aps"]:
+        return {**json, "_aps.badge": badge, "_aps.relevance-score": relevance_score}
 
-def filter_users(
-    comment: Comment, users: Iterable[AbstractUser]
-) -> Iterable[AbstractUser]:
-    return (
-        user
-        for user in users
-        if not Block.objects.filter(issuer=user, target=comment.author).exists()
+    return {
+        **json,
+        "aps": {**json["aps"], "badge": badge, "relevance-score": relevance_score},
+    }
+
+
+def filter_users(author_id: str, users: QuerySet) -> QuerySet:
+    return users.exclude(
+        id__in=Block.objects.filter(target_id=author_id).values("issuer_id")
     )
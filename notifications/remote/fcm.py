@@ -1,66 +1,208 @@
-from datetime import timedelta
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Iterator, List, Optional, Union
 
 from celery import shared_task
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import OuterRef
+from django.db.models import OuterRef, QuerySet
 from firebase_admin import exceptions, messaging
 
 from posts.models import Comment
 from users.models import Block, Connection
 
 from ..models import MessagingService, RemoteMessaging
-from . import b64encode, cut_text
+from . import (
+    b64encode,
+    comment_change_command,
+    continue_partition,
+    cut_text,
+    partition_ids,
+    report_send_errors,
+    start_fan_out,
+    watch_fan_out,
+)
+
+FCM_BATCH_SIZE = 500
+
+FCM_WORKERS = 4
 
 
 @shared_task(autoretry_for=[ObjectDoesNotExist], retry_backoff=True)
 def send_remote_notifications_comment_change(comment_id: str):
-    comment = Comment.objects.get(id=comment_id)
-    payload = make_payload(
-        comment, "comment:" + ("deletion" if comment.is_deleted else "creation")
+    comment = Comment.objects.select_related("author", "post").get(id=comment_id)
+    dispatch_comment_change(
+        comment,
+        partition_ids(
+            comment.post.subscribers.exclude(id=comment.author_id).values_list(
+                "id", flat=True
+            )
+        ),
     )
-    connections = Connection.objects.filter(
-        user_id__in=comment.post.subscribers.exclude(id=comment.author_id).values("id")
-    ).exclude(
+
+
+def dispatch_comment_change(comment: Comment, partitions: list[list[str]]):
+    payload = make_payload(comment, comment_change_command(comment))
+    notification = make_notification(comment, payload)
+    start_fan_out("fcm", str(comment.id), len(partitions))
+
+    for user_ids in partitions:
+        send_remote_notifications_comment_change_partition.delay(
+            comment_id=str(comment.id),
+            author_id=str(comment.author_id),
+            post_author_id=str(comment.post.author_id),
+            payload=payload,
+            notification=notification,
+            user_ids=user_ids,
+        )
+
+    watch_fan_out("fcm", str(comment.id))
+
+
+@shared_task
+def send_remote_notifications_comment_change_partition(
+    comment_id: str,
+    author_id: str,
+    post_author_id: str,
+    payload: dict,
+    notification: Optional[dict],
+    user_ids: list[str],
+    attempt: int = 0,
+):
+    continue_partition(
+        "fcm",
+        send_remote_notifications_comment_change_partition,
+        {
+            "comment_id": comment_id,
+            "author_id": author_id,
+            "post_author_id": post_author_id,
+            "payload": payload,
+            "notification": notification,
+            "user_ids": user_ids,
+            "attempt": attempt,
+        },
+        send_payload(payload, notification, author_id, post_author_id, user_ids),
+    )
+
+
+def send_comment_change(
+    comment: Comment, users: QuerySet, workers: int = FCM_WORKERS
+) -> dict[Any, Exception]:
+    payload = make_payload(comment, comment_change_command(comment))
+    return send_payload(
+        payload,
+        make_notification(comment, payload),
+        str(comment.author_id),
+        str(comment.post.author_id),
+        users.values("id"),
+        workers,
+    )
+
+
+def send_payload(
+    payload: dict,
+    notification: Optional[dict],
+    author_id: str,
+    post_author_id: str,
+    user_ids: Union[QuerySet, list[str]],
+    workers: int = FCM_WORKERS,
+) -> dict[Any, Exception]:
+    connections = Connection.objects.filter(user_id__in=user_ids).exclude(
         user_id__in=Block.objects.filter(
-            issuer_id=OuterRef("user_id"), target_id=comment.author_id
+            issuer_id=OuterRef("user_id"), target_id=author_id
         ).values("issuer_id")
     )
     own_remote_messagings = RemoteMessaging.objects.filter(
         service=MessagingService.FCM,
-        connection_id__in=connections.filter(user_id=comment.post.author_id),
+        connection_id__in=connections.filter(user_id=post_author_id),
     )
     other_remote_messagings = RemoteMessaging.objects.filter(
         service=MessagingService.FCM,
-        connection_id__in=connections.exclude(user_id=comment.post.author_id),
+        connection_id__in=connections.exclude(user_id=post_author_id),
     )
+    return send_batches(
+        [
+            (tokens, channel_id)
+            for remote_messagings, channel_id in zip(
+                (own_remote_messagings, other_remote_messagings),
+                ("comments_own_posts", "comments_other_posts"),
+            )
+            for tokens in iterate_tokens(remote_messagings)
+        ],
+        payload,
+        notification,
+        workers,
+    )
+
+
+def iterate_tokens(
+    remote_messagings: QuerySet, size: int = FCM_BATCH_SIZE
+) -> Iterator[list[tuple[Any, Any, str]]]:
+    remote_messagings = remote_messagings.order_by("id").values_list(
+        "id", "connection__user_id", "token"
+    )
+    last_id = None
+
+    while True:
+        chunk = list(
+            (
+                remote_messagings
+                if last_id is None
+                else remote_messagings.filter(id__gt=last_id)
+            )[:size]
+        )
+
+        if not chunk:
+            return
+
+        yield chunk
+        last_id = chunk[-1][0]
 
-    for remote_messagings, channel_id in zip(
-        (own_remote_messagings, other_remote_messagings),
-        ("comments_own_posts", "comments_other_posts"),
-    ):
-        for cursor in range(0, remote_messagings.count(), 500):
-            chunk = remote_messagings[cursor : cursor + 500]
-            batch_response = send_multicast_message(
+
+def send_batches(
+    batches: list[tuple[list[tuple[Any, Any, str]], str]],
+    payload: dict,
+    notification: Optional[dict],
+    workers: int = FCM_WORKERS,
+) -> dict[Any, Exception]:
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                send_multicast_message,
                 make_multicast_message(
-                    list(chunk.values_list("token", flat=True)),
-                    channel_id,
-                    payload,
-                    comment,
-                )
+                    [token for _, _, token in tokens], channel_id, payload, notification
+                ),
             )
+            for tokens, channel_id in batches
+        ]
+
+    stale_ids = []
+    token_errors = []
+    failures = {}
+
+    for (tokens, _), future in zip(batches, futures):
+        try:
+            batch_response = future.result()
+        except exceptions.FirebaseError as e:
+            failures.update((user_id, e) for _, user_id, _ in tokens)
+            continue
+
+        if not batch_response:
+            continue
 
-            if not batch_response:
-                break
+        for (remote_messaging_id, _, _), response in zip(
+            tokens, batch_response.responses
+        ):
+            if not response.exception:
+                continue
+            elif response.exception.code == exceptions.NOT_FOUND:
+                stale_ids.append(remote_messaging_id)
+            else:
+                token_errors.append(response.exception)
 
-            for response, remote_messaging in zip(batch_response.responses, chunk):
-                if not response.exception:
-                    break
-                elif response.exception.code == exceptions.NOT_FOUND:
-                    remote_messaging.delete()
-                else:
-                    raise response.exception
+    RemoteMessaging.objects.filter(id__in=stale_ids).delete()
+    report_send_errors(token_errors)
+    return failures
 
 
 @shared_task(autoretry_for=[ObjectDoesNotExist], retry_backoff=True)
@@ -80,7 +222,7 @@ def send_remote_notifications_comment_acknowledgement(comment_id: str, user_id:
             list(remote_messagings.values_list("token", flat=True)),
             "",
             make_payload(comment, "comment:acknowledgement"),
-            comment,
+            None,
         )
     )
 
@@ -120,10 +262,22 @@ def make_payload(comment: Optional[Comment], command: str) -> dict:
     return payload
 
 
+def make_notification(comment: Comment, payload: dict) -> Optional[dict]:
+    if payload["_command"] != "comment:creation":
+        return None
+
+    return {
+        "title": comment.author.username,
+        "body": cut_text(comment.text),
+        "tag": make_notification_tag(comment),
+        "event_timestamp": comment.date_created.isoformat(),
+    }
+
+
 def make_multicast_message(
-    tokens: List[str], channel_id: str, payload: dict, comment: Optional[Comment]
+    tokens: List[str], channel_id: str, payload: dict, notification: Optional[dict]
 ) -> messaging.MulticastMessage:
-    is_silent = payload["_command"] != "comment:creation"
+    is_silent = notification is None
     return messaging.MulticastMessage(
         tokens=tokens,
         android=messaging.AndroidConfig(
@@ -132,11 +286,13 @@ def make_multicast_message(
                 None
                 if is_silent
                 else messaging.AndroidNotification(
-                    title=comment.author.username,
-                    body=cut_text(comment.text),
-                    tag=make_notification_tag(comment),
+                    title=notification["title"],
+                    body=notification["body"],
+                    tag=notification["tag"],
                     channel_id=channel_id,
-                    event_timestamp=comment.date_created,
+                    event_timestamp=datetime.fromisoformat(
+                        notification["event_timestamp"]
+                    ),
                 )
             ),
             data={"_fcm.channel": channel_id, **payload} if is_silent else payload,
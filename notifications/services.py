@@ -9,7 +9,12 @@ from core.pagination import PaginatorMixin
 from posts.models import Comment, Subscription
 from protos import notification_pb2, notification_pb2_grpc, pagination_pb2
 
-from .models import Notification, RemoteMessaging, count_notifications_for
+from .models import (
+    Notification,
+    RemoteMessaging,
+    count_notifications_for,
+    invalidate_notification_counts,
+)
 from .pagination import NotificationPaginationAdapter
 from .tasks import send_remote_notifications_clear
 
@@ -48,9 +53,8 @@ class NotificationService(
             )
         ).update(last_comment_seen_id=F("last_comment_id"))
 
-        Notification.objects.filter(
-            subscription__in=Subscription.objects.filter(user=context.caller)
-        ).delete()
+        Notification.objects.filter(user=context.caller).delete()
+        invalidate_notification_counts([context.caller.id])
 
         send_remote_notifications_clear.delay(user_id=str(context.caller.id))
         return empty_pb2.Empty()
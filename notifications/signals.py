@@ -1,10 +1,23 @@
+from typing import Any, Optional
+
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from django.core.exceptions import ImproperlyConfigured
 from django.db.models import Model
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
 
-from core.signals import post_soft_delete
+from core.signals import post_bulk_soft_delete, post_soft_delete
+from posts.models import Post
 
-from .models import Flag, Notification, remove_notifications_for
+from .checks import check_shared_cache
+from .models import (
+    Flag,
+    Notification,
+    invalidate_notification_counts,
+    remove_notifications_for,
+    remove_notifications_for_pks,
+)
+from .remote import apns
 
 
 @receiver(post_soft_delete)
@@ -12,12 +25,25 @@ def on_post_soft_delete(instance: Model, **kwargs):
     remove_notifications_for(instance)
 
 
+@receiver(post_bulk_soft_delete)
+def on_post_bulk_soft_delete(sender: type[Model], pks: list[Any], **kwargs):
+    remove_notifications_for_pks(sender, pks)
+
+
 @receiver(post_save, sender=Notification)
 def on_notification_post_save(instance: Notification, **kwargs):
     if instance.count == 0:
         instance.delete()
 
 
+@receiver(m2m_changed, sender=Post.subscribers.through)
+def on_post_subscribers_changed(
+    instance: Model, action: str, reverse: bool, pk_set: Optional[set], **kwargs
+):
+    if action in ("post_remove", "post_clear"):
+        invalidate_notification_counts([instance.pk] if reverse else pk_set or [])
+
+
 @receiver(post_save, sender=Flag)
 def on_flag_post_save(instance: Flag, **kwargs):
     notification, created = Notification.objects.get_or_create(
@@ -27,3 +53,19 @@ def on_flag_post_save(instance: Flag, **kwargs):
 
     if not created:
         notification.save()
+
+
+@worker_init.connect
+def on_worker_init(**kwargs):
+    if errors := check_shared_cache(None):
+        raise ImproperlyConfigured(errors[0].msg)
+
+
+@worker_process_init.connect
+def on_worker_process_init(**kwargs):
+    apns.reuse_client = True
+
+
+@worker_process_shutdown.connect
+def on_worker_process_shutdown(**kwargs):
+    apns.close_client()
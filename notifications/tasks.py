@@ -1,40 +1,177 @@
+from collections import defaultdict
+from typing import Any
+
 from celery import shared_task
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import IntegrityError
+from django.db import IntegrityError, connection, models
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.db.transaction import atomic
+from django.utils.timezone import now
 
 from posts.models import Comment, Post, Subscription
 
-from .models import ApnsToken, Notification
-from .remote import apns, fcm
+from .models import Notification, invalidate_notification_counts
+from .remote import apns, fcm, partition_ids
+
+FAN_OUT_CHUNK_SIZE = 1000
 
 
 @shared_task(autoretry_for=[IntegrityError, ObjectDoesNotExist], retry_backoff=True)
-def send_notifications(comment_id: str, new_notifications: bool):
-    comment = Comment.objects.get(id=comment_id)
-    subscriptions = Subscription.objects.filter(post_id=comment.post_id).exclude(
-        user_id=comment.author_id
+def send_comment_notifications(
+    comment_id: str, new_notifications: bool, chunk_size: int = FAN_OUT_CHUNK_SIZE
+):
+    comment = Comment.objects.select_related("author", "post").get(id=comment_id)
+    partitions = partition_ids(
+        update_notifications(comment, new_notifications, chunk_size)
     )
 
-    for subscription_id in subscriptions.values_list("id", flat=True):
+    if partitions:
+        apns.dispatch_comment_change(comment, partitions)
+        fcm.dispatch_comment_change(comment, partitions)
+
+
+@shared_task(autoretry_for=[IntegrityError, ObjectDoesNotExist], retry_backoff=True)
+def send_notifications(
+    comment_id: str, new_notifications: bool, chunk_size: int = FAN_OUT_CHUNK_SIZE
+):
+    update_notifications(
+        Comment.objects.get(id=comment_id), new_notifications, chunk_size
+    )
+
+
+def update_notifications(
+    comment: Comment, new_notifications: bool, chunk_size: int = FAN_OUT_CHUNK_SIZE
+) -> list[Any]:
+    subscriptions = (
+        Subscription.objects.filter(post_id=comment.post_id)
+        .exclude(user_id=comment.author_id)
+        .order_by("id")
+    )
+    total_count = Comment.objects.filter(post_id=comment.post_id).count()
+    user_ids = []
+    last_id = None
+
+    while True:
+        chunk = (
+            subscriptions if last_id is None else subscriptions.filter(id__gt=last_id)
+        )
+        rows = list(count_unread_comments(chunk, total_count)[:chunk_size])
+
+        if not rows:
+            return user_ids
+
         with atomic():
-            notification_data = {
-                "subscription_id": subscription_id,
-                "target_type": ContentType.objects.get_for_model(Post),
-                "target_id": comment.post_id,
-            }
-
-            if new_notifications:
-                notification, created = Notification.objects.get_or_create(
-                    **notification_data
-                )
-            else:
-                notification = Notification.objects.filter(**notification_data).first()
-                created = False
+            apply_notification_counts(comment.post_id, rows, new_notifications)
+
+        user_ids.extend(user_id for _, user_id, _ in rows)
+        last_id = rows[-1][0]
 
-            if notification and not created:
-                notification.save()
+
+@shared_task(autoretry_for=[IntegrityError], retry_backoff=True)
+def acknowledge_comments(post_id: str, user_id: str):
+    Subscription.objects.filter(post_id=post_id, user_id=user_id).update(
+        date_acknowledgement_scheduled=None
+    )
+    subscriptions = Subscription.objects.filter(
+        post_id=post_id, user_id=user_id, last_comment_seen__isnull=False
+    )
+    rows = list(count_unread_comments(subscriptions, 0))
+
+    if not rows:
+        return
+
+    with atomic():
+        apply_notification_counts(post_id, rows, new_notifications=False)
+
+    send_remote_notifications_comment_acknowledgement.delay(
+        comment_id=str(subscriptions.values_list("last_comment_seen", flat=True)[0]),
+        user_id=user_id,
+    )
+
+
+def count_unread_comments(
+    subscriptions: models.QuerySet, total_count: int
+) -> models.QuerySet:
+    return subscriptions.annotate(
+        comment_count=Case(
+            When(last_comment_seen__isnull=True, then=Value(total_count)),
+            default=Coalesce(Subquery(newer_comment_counts()), 0),
+        )
+    ).values_list("id", "user_id", "comment_count")
+
+
+def newer_comment_counts() -> models.QuerySet:
+    seen_date = OuterRef("last_comment_seen__date_created")
+    return (
+        Comment.objects.filter(post_id=OuterRef("post_id"), is_deleted=False)
+        .filter(
+            Q(date_created__gt=seen_date)
+            | Q(date_created=seen_date, id__gt=OuterRef("last_comment_seen_id"))
+        )
+        .order_by()
+        .values("post_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+
+
+def apply_notification_counts(
+    post_id: Any, rows: list[tuple[Any, Any, int]], new_notifications: bool
+):
+    counts = {subscription_id: count for subscription_id, _, count in rows}
+    user_ids = {subscription_id: user_id for subscription_id, user_id, _ in rows}
+    invalidate_notification_counts(user_ids.values())
+    target_type = ContentType.objects.get_for_model(Post)
+    notifications = Notification.objects.filter(
+        target_type=target_type, target_id=post_id
+    )
+    notifications.filter(
+        subscription_id__in=[i for i, count in counts.items() if count == 0]
+    ).delete()
+    subscription_ids_by_count = defaultdict(list)
+
+    for subscription_id, count in counts.items():
+        if count > 0:
+            subscription_ids_by_count[count].append(subscription_id)
+
+    if not subscription_ids_by_count:
+        return
+    elif new_notifications:
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    subscription_id=subscription_id,
+                    user_id=user_ids[subscription_id],
+                    target_type=target_type,
+                    target_id=post_id,
+                    count=count,
+                )
+                for count, subscription_ids in subscription_ids_by_count.items()
+                for subscription_id in subscription_ids
+            ],
+            update_conflicts=True,
+            update_fields=["count", "date_updated"],
+            unique_fields=(
+                ["subscription"]
+                if connection.features.supports_update_conflicts_with_target
+                else None
+            ),
+        )
+    else:
+        notifications.filter(
+            subscription_id__in=[i for i, count in counts.items() if count > 0]
+        ).update(
+            count=Case(
+                *[
+                    When(subscription_id__in=subscription_ids, then=Value(count))
+                    for count, subscription_ids in subscription_ids_by_count.items()
+                ],
+                default=F("count"),
+            ),
+            date_updated=now(),
+        )
 
 
 @shared_task(autoretry_for=[ObjectDoesNotExist], retry_backoff=True)
@@ -60,12 +197,3 @@ def send_remote_notifications_comment_acknowledgement(comment_id: str, user_id:
 def send_remote_notifications_clear(user_id: str):
     apns.send_remote_notifications_clear.delay(user_id=user_id)
     fcm.send_remote_notifications_clear.delay(user_id=user_id)
-
-
-@shared_task
-@atomic
-def refresh_apns_token():
-    if token := ApnsToken.objects.first():
-        token.delete()
-
-    ApnsToken.objects.create(token=apns.make_jwt())
@@ -0,0 +1,17 @@
+from django.test import TestCase, override_settings
+
+from .checks import check_shared_cache
+
+
+class CheckSharedCache(TestCase):
+    def test(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(IS_TESTING=False, DEBUG=False)
+    def test_local(self):
+        [error] = check_shared_cache(None)
+        self.assertEqual(error.id, "notifications.E001")
+
+    @override_settings(IS_TESTING=False, DEBUG=True)
+    def test_debug(self):
+        self.assertEqual(check_shared_cache(None), [])
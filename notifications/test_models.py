@@ -1,7 +1,7 @@
 from posts.models import Comment
 from posts.tests import PublishedPostTestCase
 
-from .models import Notification
+from .models import Notification, count_notifications_for_users
 
 
 class Comment_create(PublishedPostTestCase):
@@ -14,6 +14,8 @@ class Comment_create(PublishedPostTestCase):
         notification = notifications.first()
         self.assertEqual(notification.subscription.user, self.main_user)
         self.assertEqual(notification.subscription.post, self.post)
+        self.assertEqual(notification.user, self.main_user)
+        self.assertEqual(notification.importance, 0)
         self.assertEqual(notification.count, 1)
 
     def test_same_author(self):
@@ -32,3 +34,18 @@ class Notification_save(PublishedPostTestCase):
         Comment.objects.create(post=self.post, author=self.other_user, text="Text")
         notification.refresh_from_db()
         self.assertEqual(notification.count, 2)
+
+
+class Count_notifications_for_users(PublishedPostTestCase):
+    def test(self):
+        Comment.objects.create(post=self.post, author=self.other_user, text="Text")
+        Comment.objects.create(post=self.post, author=self.other_user, text="Text")
+        users = [self.main_user, self.other_user]
+
+        with self.assertNumQueries(1):
+            counts = count_notifications_for_users(users)
+
+        self.assertEqual(counts, {self.main_user.id: 2, self.other_user.id: 0})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(count_notifications_for_users(users), counts)
@@ -1,7 +1,10 @@
 from typing import Iterator, List
-from uuid import UUID
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now
 
 from core.tests import PaginationTestCase
@@ -35,6 +38,15 @@ class NotificationService_Count(NotificationServiceTestCase):
         count = self.service.Count(self.request, self.grpc_context)
         self.assertEqual(count.count, Comment.objects.count())
 
+    def test_cached(self):
+        post = self.main_posts[0]
+        Comment.objects.create(author=self.other_user, post=post, text="Text")
+        self.assertEqual(self.service.Count(self.request, self.grpc_context).count, 1)
+        Comment.objects.create(author=self.other_user, post=post, text="Text")
+        self.assertEqual(self.service.Count(self.request, self.grpc_context).count, 2)
+        post.subscribers.remove(self.main_user)
+        self.assertEqual(self.service.Count(self.request, self.grpc_context).count, 0)
+
     def test_no_subscription(self):
         Comment.objects.create(
             author=self.other_user, post=self.other_posts[0], text="Text"
@@ -89,9 +101,7 @@ class NotificationService_List(NotificationServiceTestCase, PaginationTestCase):
         return self.service.List(request_iterator, self.grpc_context)
 
     def check(self, item: notification_pb2.Notification, position: int):
-        self.assertEqual(
-            item.post.id, UUID(self.notifications[position].target_id).bytes
-        )
+        self.assertEqual(item.post.id, self.notifications[position].target_id.bytes)
         self.assertEqual(item.count, self.notifications[position].count)
 
     def test(self):
@@ -118,6 +128,33 @@ class NotificationService_List(NotificationServiceTestCase, PaginationTestCase):
     def test_out_of_bounds(self):
         self.run_test_out_of_bounds(self.out_of_bounds_cursor)
 
+    def test_mixed_targets(self):
+        self.main_user.is_staff = True
+        self.main_user.save()
+        notifications = Notification.objects.filter_readable_by(self.main_user)
+        flag_count = settings.PAGINATION_MAX_SIZE - notifications.count()
+        comments = self._create_comments(author=self.other_user, count=flag_count // 2)
+        users = [
+            get_user_model().objects.create_user(
+                username=f"user{i}", email=f"user{i}@fyreplace.app"
+            )
+            for i in range(flag_count - len(comments))
+        ]
+
+        for target in comments + users:
+            Flag.objects.create(issuer=self.other_user, target=target)
+
+        self.assertEqual(notifications.count(), settings.PAGINATION_MAX_SIZE)
+        requests = self.get_initial_requests(
+            forward=True, size=settings.PAGINATION_MAX_SIZE
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            items = next(self.paginate(requests))
+
+        self.assertEqual(len(items.notifications), settings.PAGINATION_MAX_SIZE)
+        self.assertEqual(len(queries), 7)
+
     def _create_test_notifications(self) -> List[Notification]:
         self._create_comments(author=self.other_user, count=14)
         self._create_comments(author=self.main_user, count=4)
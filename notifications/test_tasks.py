@@ -0,0 +1,261 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Post, Subscription
+from posts.tests import BaseCommentTestCase
+from tooling.apns import ApnsServer, make_private_key
+from tooling.fcm import FakeMessaging
+from users.models import Block, Connection
+
+from .models import MessagingService, Notification, RemoteMessaging
+from .remote import (
+    apns,
+    check_fan_out,
+    fan_out_progress,
+    fcm,
+    partition_ids,
+    start_fan_out,
+)
+from .tasks import send_comment_notifications, send_notifications
+
+
+class Task_send_notifications(BaseCommentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.notifications = Notification.objects.filter(
+            target_type=ContentType.objects.get_for_model(Post),
+            target_id=self.post.id,
+            subscription__user=self.main_user,
+        )
+
+    def test(self):
+        self.assertEqual(self.notifications.get().count, 1)
+        Comment.objects.create(post=self.post, author=self.other_user, text="Text")
+        self.assertEqual(self.notifications.get().count, 2)
+
+    def test_chunks(self):
+        for _ in range(3):
+            comment = Comment.objects.create(
+                post=self.post, author=self.other_user, text="Text"
+            )
+
+        send_notifications(str(comment.id), new_notifications=True, chunk_size=1)
+        self.assertEqual(self.notifications.get().count, 4)
+
+    def test_seen(self):
+        Subscription.objects.filter(user=self.main_user, post=self.post).update(
+            last_comment_seen=self.comment
+        )
+        send_notifications(str(self.comment.id), new_notifications=False)
+        self.assertFalse(self.notifications.exists())
+
+    def test_partially_seen(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.other_user, text="Text"
+        )
+        Subscription.objects.filter(user=self.main_user, post=self.post).update(
+            last_comment_seen=self.comment
+        )
+        send_notifications(str(comment.id), new_notifications=False)
+        self.assertEqual(self.notifications.get().count, 1)
+
+
+class PartitionIds(BaseCommentTestCase):
+    def test(self):
+        ids = list(get_user_model().objects.values_list("id", flat=True))
+        partitions = partition_ids(reversed(ids), size=1)
+        self.assertEqual(partitions, [[str(i)] for i in sorted(ids, key=str)])
+
+    def test_empty(self):
+        self.assertEqual(partition_ids([]), [])
+
+
+class CheckFanOut(TestCase):
+    def test(self):
+        start_fan_out("apns", "comment", 2)
+        check_fan_out("apns", "comment")
+        self.assertIsNone(fan_out_progress("apns", "comment"))
+
+
+class Task_send_comment_notifications(BaseCommentTestCase):
+    def test(self):
+        Subscription.objects.filter(user=self.main_user, post=self.post).delete()
+        send_comment_notifications(str(self.comment.id), new_notifications=True)
+        self.assertFalse(Notification.objects.filter(target_id=self.post.id).exists())
+
+        for name in ("apns", "fcm"):
+            self.assertIsNone(fan_out_progress(name, str(self.comment.id)))
+
+    def test_chunks(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.other_user, text="Text"
+        )
+        send_comment_notifications(
+            str(comment.id), new_notifications=True, chunk_size=1
+        )
+        self.assertEqual(
+            Notification.objects.get(
+                target_id=self.post.id, subscription__user=self.main_user
+            ).count,
+            2,
+        )
+
+        for name in ("apns", "fcm"):
+            self.assertIsNone(fan_out_progress(name, str(comment.id)))
+
+
+class Task_send_remote_notifications_comment_change(BaseCommentTestCase):
+    def test(self):
+        apns.send_remote_notifications_comment_change(str(self.comment.id))
+        self.assertIsNone(fan_out_progress("apns", str(self.comment.id)))
+
+
+class Apns_send_message(BaseCommentTestCase):
+    def setUp(self):
+        super().setUp()
+
+        for token in ("active", "gone"):
+            RemoteMessaging.objects.create(
+                connection=Connection.objects.create(user=self.main_user),
+                service=MessagingService.APNS,
+                token=token,
+            )
+
+    def send(self):
+        with ApnsServer(gone_tokens=["gone"]) as server, override_settings(
+            APNS_URL=server.url, APNS_PRIVATE_KEY=make_private_key()
+        ):
+            apns.send_message(None, [self.main_user], "notifications:clear")
+
+        self.assertEqual(server.request_count, 2)
+        self.assertEqual(
+            list(RemoteMessaging.objects.values_list("token", flat=True)), ["active"]
+        )
+
+    def test(self):
+        self.send()
+
+    def test_persistent_client(self):
+        apns.reuse_client = True
+
+        try:
+            self.assertIsNone(apns.client)
+            self.send()
+            self.assertIsNotNone(apns.client)
+        finally:
+            apns.reuse_client = False
+            apns.close_client()
+
+        self.assertIsNone(apns.client)
+
+
+class Apns_dispatch_comment_change(BaseCommentTestCase):
+    def test_unavailable(self):
+        reader = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com"
+        )
+
+        for user, token in ((self.main_user, "active"), (reader, "unavailable")):
+            RemoteMessaging.objects.create(
+                connection=Connection.objects.create(user=user),
+                service=MessagingService.APNS,
+                token=token,
+            )
+
+        with ApnsServer(
+            unavailable_tokens=["unavailable"]
+        ) as server, override_settings(
+            APNS_URL=server.url, APNS_PRIVATE_KEY=make_private_key()
+        ):
+            apns.dispatch_comment_change(
+                self.comment, [[str(self.main_user.id), str(reader.id)]]
+            )
+
+        self.assertEqual(server.request_count, 3)
+        self.assertIsNone(fan_out_progress("apns", str(self.comment.id)))
+
+
+class Apns_ProviderToken(TestCase):
+    @override_settings(APNS_PRIVATE_KEY=make_private_key())
+    def test(self):
+        token = apns.ProviderToken(timedelta(minutes=40))
+        self.assertEqual(token.get(), token.get())
+        token = apns.ProviderToken(timedelta())
+        self.assertNotEqual(token.get(), token.get())
+
+
+class Apns_filter_users(BaseCommentTestCase):
+    def test(self):
+        Block.objects.create(issuer=self.main_user, target=self.other_user)
+        users = get_user_model().objects.filter(
+            id__in=[self.main_user.id, self.other_user.id]
+        )
+        self.assertEqual(
+            list(apns.filter_users(str(self.comment.author_id), users)),
+            [self.other_user],
+        )
+
+
+class Fcm_dispatch_comment_change(BaseCommentTestCase):
+    def setUp(self):
+        super().setUp()
+
+        for token in ("active", "gone", "invalid"):
+            RemoteMessaging.objects.create(
+                connection=Connection.objects.create(user=self.main_user),
+                service=MessagingService.FCM,
+                token=token,
+            )
+
+    def test(self):
+        with FakeMessaging(
+            ["gone"], invalid_tokens=["invalid"]
+        ) as fake, override_settings(FIREBASE_APP=True):
+            fcm.dispatch_comment_change(self.comment, [[str(self.main_user.id)]])
+
+        self.assertEqual(fake.token_count, 3)
+        self.assertEqual(
+            sorted(RemoteMessaging.objects.values_list("token", flat=True)),
+            ["active", "invalid"],
+        )
+
+    def test_unavailable(self):
+        reader = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com"
+        )
+        RemoteMessaging.objects.create(
+            connection=Connection.objects.create(user=reader),
+            service=MessagingService.FCM,
+            token="unavailable",
+        )
+
+        with FakeMessaging(
+            unavailable_tokens=["unavailable"]
+        ) as fake, override_settings(FIREBASE_APP=True):
+            fcm.dispatch_comment_change(
+                self.comment, [[str(self.main_user.id), str(reader.id)]]
+            )
+
+        self.assertEqual(fake.batch_count, 3)
+        self.assertEqual(fake.token_count, 5)
+        self.assertIsNone(fan_out_progress("fcm", str(self.comment.id)))
+
+
+class Fcm_iterate_tokens(BaseCommentTestCase):
+    def test(self):
+        for i in range(5):
+            RemoteMessaging.objects.create(
+                connection=Connection.objects.create(user=self.main_user),
+                service=MessagingService.FCM,
+                token=f"token{i}",
+            )
+
+        chunks = list(fcm.iterate_tokens(RemoteMessaging.objects.all(), size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(
+            sorted(token for chunk in chunks for _, _, token in chunk),
+            [f"token{i}" for i in range(5)],
+        )
@@ -0,0 +1,140 @@
+from typing import NamedTuple, Optional
+
+from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.db.transaction import atomic, on_commit
+from google.protobuf.message import Message
+from grpc_interceptor.exceptions import GrpcException, InvalidArgument, PermissionDenied
+
+from .models import Chapter, Post, position_between
+
+
+class ChapterOperation(NamedTuple):
+    method: str
+    request: Message
+
+
+class ChapterEditor:
+    OPERATIONS = {
+        "Create": "create",
+        "Move": "move",
+        "UpdateText": "update_text",
+        "Delete": "delete",
+    }
+
+    def __init__(self, post: Post):
+        self.post = post
+        self.chapters = list(post.chapters.select_for_update())
+        self.used_positions = {chapter.position for chapter in self.chapters}
+        self.deleted_ids = set()
+        self.changed_ids = set()
+        self.removed_images = []
+
+    @atomic
+    def apply(self, operations: list[ChapterOperation]) -> list[Optional[str]]:
+        errors = []
+
+        for operation in operations:
+            try:
+                if operation.method not in self.OPERATIONS:
+                    raise InvalidArgument("invalid_operation")
+
+                getattr(self, self.OPERATIONS[operation.method])(operation.request)
+                errors.append(None)
+            except GrpcException as e:
+                errors.append(e.details)
+            except ValidationError as e:
+                errors.append("; ".join(e.messages))
+
+        self.save()
+        return errors
+
+    def create(self, request: Message):
+        if request.position > len(self.chapters):
+            raise InvalidArgument("invalid_position")
+        elif len(self.chapters) >= Post.MAX_CHAPTERS:
+            raise PermissionDenied("too_many_chapters")
+
+        chapter = Chapter(post=self.post)
+        self.insert(chapter, request.position)
+
+    def move(self, request: Message):
+        chapter = self.get_chapter_at(request.from_position)
+        self.get_chapter_at(request.to_position)
+        self.chapters.remove(chapter)
+        self.insert(chapter, request.to_position)
+
+    def update_text(self, request: Message):
+        chapter = self.get_chapter_at(request.location.position)
+
+        for name, value in (("text", request.text), ("is_title", request.is_title)):
+            Chapter._meta.get_field(name).clean(value, chapter)
+
+        if chapter.image:
+            self.removed_images.append((chapter.image.storage, chapter.image.name))
+            chapter.image = None
+
+        chapter.text = request.text
+        chapter.is_title = request.is_title
+        self.changed_ids.add(chapter.id)
+
+    def delete(self, request: Message):
+        chapter = self.get_chapter_at(request.position)
+        self.chapters.remove(chapter)
+
+        if not chapter._state.adding:
+            self.deleted_ids.add(chapter.id)
+
+    def get_chapter_at(self, position: int) -> Chapter:
+        if position < 0 or position >= len(self.chapters):
+            raise InvalidArgument("invalid_position")
+
+        return self.chapters[position]
+
+    def insert(self, chapter: Chapter, position: int):
+        before = self.chapters[position - 1].position if position > 0 else None
+        after = (
+            self.chapters[position].position if position < len(self.chapters) else None
+        )
+        new_position = position_between(before, after)
+
+        while new_position in self.used_positions:
+            new_position = position_between(before, new_position)
+
+        chapter.position = new_position
+        self.used_positions.add(new_position)
+        self.chapters.insert(position, chapter)
+        self.changed_ids.add(chapter.id)
+
+    def save(self):
+        created = [chapter for chapter in self.chapters if chapter._state.adding]
+        updated = [
+            chapter
+            for chapter in self.chapters
+            if chapter.id in self.changed_ids and not chapter._state.adding
+        ]
+
+        if self.deleted_ids:
+            Chapter.objects.filter(id__in=self.deleted_ids).delete()
+
+        Chapter.objects.bulk_create(created)
+        Chapter.objects.bulk_update(
+            updated, ["position", "text", "is_title", "image", "width", "height"]
+        )
+
+        for storage, name in self.removed_images:
+            on_commit(lambda storage=storage, name=name: storage.delete(name))
+
+        if any(
+            len(chapter.position) > Chapter.MAX_POSITION_LENGTH
+            for chapter in self.chapters
+        ):
+            self.post.normalize_chapters()
+
+
+@atomic
+def edit_chapters(
+    user: AbstractUser, post_id: bytes, operations: list[ChapterOperation]
+) -> list[Optional[str]]:
+    post = Post.existing_objects.get_writable_by(user, id__bytes=post_id)
+    return ChapterEditor(post).apply(operations)
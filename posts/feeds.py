@@ -0,0 +1,112 @@
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from functools import cache
+from threading import Lock
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils.timezone import now
+
+from protos import post_pb2
+
+FeedEntry = tuple[datetime, post_pb2.Post]
+
+
+class AnonymousFeed:
+    def __init__(self):
+        self._lock = Lock()
+        self._entries: list[FeedEntry] = []
+        self._dates: list[datetime] = []
+        self._is_complete = False
+        self._date_refreshed: Optional[datetime] = None
+
+    def invalidate(self):
+        self._date_refreshed = None
+
+    def entries_after(self, date: Optional[datetime], count: int) -> list[FeedEntry]:
+        entries, dates, is_complete = self.snapshot()
+        deadline = now() - settings.FYREPLACE_POST_MAX_DURATION
+        start = bisect_left(dates, deadline)
+
+        if date:
+            start = max(start, bisect_right(dates, date))
+
+        result = entries[start : start + count]
+
+        if len(result) < count and not is_complete:
+            result += self.load(
+                date_after=result[-1][0] if result else date,
+                count=count - len(result),
+            )
+
+        return result
+
+    def snapshot(self) -> tuple[list[FeedEntry], list[datetime], bool]:
+        with self._lock:
+            if (
+                self._date_refreshed is None
+                or now() - self._date_refreshed
+                > settings.FYREPLACE_ANONYMOUS_FEED_REFRESH
+            ):
+                date_refreshed = now()
+                self._entries = self.load(count=settings.FYREPLACE_ANONYMOUS_FEED_SIZE)
+                self._dates = [date for date, _ in self._entries]
+                self._is_complete = (
+                    len(self._entries) < settings.FYREPLACE_ANONYMOUS_FEED_SIZE
+                )
+                self._date_refreshed = date_refreshed
+
+            return self._entries, self._dates, self._is_complete
+
+    def load(
+        self, count: int, date_after: Optional[datetime] = None
+    ) -> list[FeedEntry]:
+        from .models import Post
+
+        posts = Post.active_objects.all()
+
+        if date_after:
+            posts = posts.filter(date_published__gt=date_after)
+
+        return [
+            (post.date_published, post.to_message(**post.overrides_for_user(None)))
+            for post in posts.order_by("date_published")
+            .select_related()
+            .prefetch_related("chapters")[:count]
+        ]
+
+
+@cache
+def get_anonymous_feed() -> AnonymousFeed:
+    return AnonymousFeed()
+
+
+@cache
+def get_prefetch_executor() -> Optional[ThreadPoolExecutor]:
+    workers = settings.FYREPLACE_FEED_PREFETCH_WORKERS
+    return ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+
+
+def prefetch(function: Callable[..., Any], *args) -> Future:
+    if executor := get_prefetch_executor():
+
+        def run() -> Any:
+            close_old_connections()
+
+            try:
+                return function(*args)
+            finally:
+                connection.close()
+
+        return executor.submit(run)
+
+    future = Future()
+
+    try:
+        future.set_result(function(*args))
+    except Exception as e:
+        future.set_exception(e)
+
+    return future
@@ -0,0 +1,44 @@
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import core.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0006_subscription_date_last_seen"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LifeDelta",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("delta", models.IntegerField(default=0)),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="posts.post",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["post", "shard"],
+                "unique_together": {("post", "shard")},
+            },
+            bases=(models.Model, core.models.MessageConvertible),
+        ),
+    ]
@@ -0,0 +1,61 @@
+import django.utils.timezone
+from django.apps.registry import Apps
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.timezone import now
+
+from core.bloom import BloomFilter
+
+
+def fill_voted_filters(apps: Apps, *args, **kwargs):
+    Stack = apps.get_model("posts", "Stack")
+    Vote = apps.get_model("posts", "Vote")
+    deadline = now() - settings.FYREPLACE_POST_MAX_DURATION
+    votes = (
+        Vote.objects.filter(post__date_published__gte=deadline)
+        .order_by("user_id")
+        .values_list("user_id", "post_id")
+    )
+    filters = {}
+
+    for user_id, post_id in votes.iterator():
+        if user_id not in filters:
+            filters[user_id] = BloomFilter(
+                b"",
+                size=settings.FYREPLACE_VOTED_FILTER_SIZE,
+                hashes=settings.FYREPLACE_VOTED_FILTER_HASHES,
+            )
+
+        filters[user_id].add(post_id.bytes)
+
+    for user_id, voted_filter in filters.items():
+        Stack.objects.filter(user_id=user_id).update(voted_filter=bytes(voted_filter))
+
+
+def noop(*args, **kwargs):
+    pass
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0007_lifedelta"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stack",
+            name="voted_filter",
+            field=models.BinaryField(default=b""),
+        ),
+        migrations.AddField(
+            model_name="stack",
+            name="previous_voted_filter",
+            field=models.BinaryField(default=b""),
+        ),
+        migrations.AddField(
+            model_name="stack",
+            name="date_voted_filter_rotated",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(fill_voted_filters, noop),
+    ]
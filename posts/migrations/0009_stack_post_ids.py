@@ -0,0 +1,57 @@
+from uuid import UUID
+
+from django.apps.registry import Apps
+from django.db import migrations, models
+
+
+def pack_post_ids(apps: Apps, *args, **kwargs):
+    Stack = apps.get_model("posts", "Stack")
+    Visibility = apps.get_model("posts", "Visibility")
+    visibilities = Visibility.objects.order_by(
+        "stack_id", "post__date_published"
+    ).values_list("stack_id", "post_id")
+    post_ids = {}
+
+    for stack_id, post_id in visibilities.iterator():
+        post_ids.setdefault(stack_id, []).append(post_id)
+
+    for stack_id, ids in post_ids.items():
+        Stack.objects.filter(id=stack_id).update(
+            post_ids=b"".join(i.bytes for i in ids)
+        )
+
+
+def unpack_post_ids(apps: Apps, *args, **kwargs):
+    Stack = apps.get_model("posts", "Stack")
+    Visibility = apps.get_model("posts", "Visibility")
+
+    for stack_id, data in Stack.objects.exclude(post_ids=b"").values_list(
+        "id", "post_ids"
+    ):
+        data = bytes(data)
+        Visibility.objects.bulk_create(
+            Visibility(stack_id=stack_id, post_id=UUID(bytes=data[i : i + 16]))
+            for i in range(0, len(data), 16)
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0008_stack_voted_filters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stack",
+            name="post_ids",
+            field=models.BinaryField(default=b""),
+        ),
+        migrations.RunPython(pack_post_ids, unpack_post_ids),
+        migrations.RemoveField(
+            model_name="stack",
+            name="posts",
+        ),
+        migrations.DeleteModel(
+            name="Visibility",
+        ),
+    ]
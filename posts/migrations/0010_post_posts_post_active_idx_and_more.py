@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0009_stack_post_ids"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(
+                    ("date_published__isnull", False),
+                    ("is_deleted", False),
+                    ("life__gt", 0),
+                ),
+                fields=["date_published"],
+                name="posts_post_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["author", "date_published"],
+                name="posts_post_existing_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["post", "date_created"],
+                name="posts_comment_existing_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0010_post_posts_post_active_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subscription",
+            name="date_acknowledgement_scheduled",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
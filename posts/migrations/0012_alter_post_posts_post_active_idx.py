@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0011_subscription_date_acknowledgement_scheduled"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(model_name="post", name="posts_post_active_idx"),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(
+                    ("date_published__isnull", False), ("is_deleted", False)
+                ),
+                fields=["date_published"],
+                name="posts_post_active_idx",
+            ),
+        ),
+    ]
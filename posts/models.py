@@ -1,15 +1,19 @@
-from math import ceil
-from typing import Any, Dict, Optional, Tuple
+from collections import defaultdict
+from itertools import count
+from random import randint, randrange
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import UUID
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MaxLengthValidator, MinValueValidator
-from django.db import models
-from django.db.models.functions import Replace
+from django.db import IntegrityError, models
+from django.db.models.functions import Coalesce
 from django.db.transaction import atomic
 from django.utils.timezone import now
 from grpc_interceptor.exceptions import InvalidArgument, PermissionDenied
 
+from core.bloom import BloomFilter
 from core.models import (
     ExistingManager,
     MessageConvertible,
@@ -19,6 +23,12 @@ from core.models import (
 )
 from core.validators import FileSizeValidator
 from protos import comment_pb2, post_pb2
+from users.models import Block
+
+from .feeds import get_anonymous_feed
+from .pools import get_candidate_pool
+
+POSITION_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
 
 
 def position_between(before: Optional[str], after: Optional[str]) -> str:
@@ -26,19 +36,66 @@ def position_between(before: Optional[str], after: Optional[str]) -> str:
         if not isinstance(arg, (str, type(None))):
             raise TypeError("Arguments must be strings or None")
 
-    len_before = len(before) if before else 0
-    len_after = len(after) if after else 0
-
-    if not before and not after:
-        return "z"
-    elif before == after:
+    if before and before == after:
         raise RuntimeError("Arguments must be different")
     elif before and after and before > after:
         raise RuntimeError("Before and after are inverted")
-    elif not after or len_before >= len_after:
-        return before + "z"
+
+    return midpoint(before or "", after or None)
+
+
+def midpoint(before: str, after: Optional[str]) -> str:
+    if after is not None:
+        common = 0
+
+        while common < len(after) and after[common] == (
+            before[common] if common < len(before) else POSITION_DIGITS[0]
+        ):
+            common += 1
+
+        if common > 0:
+            return after[:common] + midpoint(before[common:], after[common:])
+
+    low = POSITION_DIGITS.index(before[0]) if before else 0
+    high = POSITION_DIGITS.index(after[0]) if after else len(POSITION_DIGITS)
+
+    if high - low > 1:
+        middle = (low + high) // 2
+        spread = (high - low) // 4
+        return POSITION_DIGITS[randint(middle - spread, middle + spread)]
+    elif after and len(after) > 1:
+        return after[0]
     else:
-        return after[:-1] + "a" + "z"
+        return POSITION_DIGITS[low] + midpoint(before[1:], None)
+
+
+def spaced_positions(size: int, length: int) -> list[str]:
+    base = len(POSITION_DIGITS)
+    step = base**length // (size + 1)
+    positions = []
+
+    for i in range(1, size + 1):
+        value = step * i
+        value += 1 if value % base == 0 else 0
+        digits = []
+
+        for _ in range(length):
+            value, digit = divmod(value, base)
+            digits.append(POSITION_DIGITS[digit])
+
+        positions.append("".join(reversed(digits)))
+
+    return positions
+
+
+def count_subquery(queryset: models.QuerySet) -> models.Subquery:
+    return models.Subquery(
+        queryset.order_by()
+        .values("post_id")
+        .annotate(count=models.Count("id"))
+        .values("count"),
+        output_field=models.IntegerField(),
+    )
 
 
 class ValidatableModel(UUIDModel, MessageConvertible):
@@ -96,12 +153,33 @@ class DraftPostManager(ExistingPostManager):
 class ActivePostManager(ExistingPostManager):
     def get_queryset(self) -> models.QuerySet:
         deadline = now() - settings.FYREPLACE_POST_MAX_DURATION
-        return super().get_queryset().filter(date_published__gte=deadline, life__gt=0)
+        return (
+            super()
+            .get_queryset()
+            .filter(date_published__gte=deadline)
+            .alias(
+                effective_life=models.F("life")
+                + Coalesce(models.Subquery(LifeDelta.pending_for("id")), 0)
+            )
+            .filter(effective_life__gt=0)
+        )
 
 
 class Post(TimestampModel, SoftDeleteModel, ValidatableModel):
     class Meta:
         ordering = ["date_published", "date_created", "id"]
+        indexes = [
+            models.Index(
+                fields=["date_published"],
+                condition=models.Q(is_deleted=False, date_published__isnull=False),
+                name="posts_post_active_idx",
+            ),
+            models.Index(
+                fields=["author", "date_published"],
+                condition=models.Q(is_deleted=False),
+                name="posts_post_existing_idx",
+            ),
+        ]
 
     MAX_CHAPTERS = 10
     objects = models.Manager()
@@ -128,16 +206,31 @@ class Post(TimestampModel, SoftDeleteModel, ValidatableModel):
     date_published = models.DateTimeField(null=True)
     life = models.IntegerField(default=0, validators=[MinValueValidator(0)])
 
+    @property
+    def effective_life(self) -> int:
+        return self.life + (
+            LifeDelta.objects.filter(post_id=self.id).aggregate(
+                total=models.Sum("delta")
+            )["total"]
+            or 0
+        )
+
     @property
     def chapter_count(self) -> int:
         return self.chapters.count()
 
     @property
     def vote_count(self) -> int:
+        if hasattr(self, "prefetched_vote_count"):
+            return self.prefetched_vote_count
+
         return Vote.objects.filter(post_id=self.id).count()
 
     @property
     def comment_count(self) -> int:
+        if hasattr(self, "prefetched_comment_count"):
+            return self.prefetched_comment_count
+
         return Comment.existing_objects.filter(post_id=self.id).count()
 
     def __str__(self) -> str:
@@ -170,6 +263,20 @@ class Post(TimestampModel, SoftDeleteModel, ValidatableModel):
     def perform_soft_delete(self):
         self.life = 0
         super().perform_soft_delete()
+        LifeDelta.objects.filter(post_id=self.id).delete()
+        get_candidate_pool().discard(self.id)
+        get_anonymous_feed().invalidate()
+
+    @classmethod
+    def perform_bulk_soft_delete(cls, pks: list[Any]):
+        cls.objects.filter(pk__in=pks).update(is_deleted=True, life=0)
+        LifeDelta.objects.filter(post_id__in=pks).delete()
+        pool = get_candidate_pool()
+
+        for pk in pks:
+            pool.discard(pk)
+
+        get_anonymous_feed().invalidate()
 
     @atomic
     def publish(self, anonymous: bool):
@@ -182,6 +289,34 @@ class Post(TimestampModel, SoftDeleteModel, ValidatableModel):
         self.life = 10
         self.save()
         self.subscribers.add(self.author)
+        get_candidate_pool().add(self)
+        get_anonymous_feed().invalidate()
+
+    @classmethod
+    def consume_life(cls, post_id: Any) -> bool:
+        if get_candidate_pool().reserve_life(post_id) is False:
+            return False
+
+        return LifeDelta.consume(post_id)
+
+    @classmethod
+    def add_life(cls, post_id: Any, amount: int):
+        LifeDelta.record(post_id, amount)
+        get_candidate_pool().update_life(post_id, amount)
+
+    @classmethod
+    def add_lives(cls, amounts: dict[UUID, int]):
+        amounts = {
+            post_id: amounts[post_id]
+            for post_id in cls.existing_objects.filter(id__in=amounts).values_list(
+                "id", flat=True
+            )
+        }
+        LifeDelta.record_many(amounts)
+        pool = get_candidate_pool()
+
+        for post_id, amount in amounts.items():
+            pool.update_life(post_id, amount)
 
     def validate(self):
         if self.chapters.count() == 0:
@@ -216,23 +351,23 @@ class Post(TimestampModel, SoftDeleteModel, ValidatableModel):
 
     @atomic
     def normalize_chapters(self):
-        self.chapters.select_for_update().update(
-            position=Replace(
-                Replace(models.F("position"), models.Value("z"), models.Value("y")),
-                models.Value("a"),
-                models.Value("b"),
+        chapters = list(self.chapters.select_for_update().values_list("id", "position"))
+        lengths = {len(position) for _, position in chapters}
+        length = next(
+            i
+            for i in count(2)
+            if i not in lengths and len(POSITION_DIGITS) ** i > 2 * (len(chapters) + 1)
+        )
+        positions = spaced_positions(len(chapters), length)
+        self.chapters.update(
+            position=models.Case(
+                *[
+                    models.When(id=chapter_id, then=models.Value(position))
+                    for (chapter_id, _), position in zip(chapters, positions)
+                ],
+                default=models.F("position"),
             )
         )
-        chapters = self.chapters.all()
-        a_length = ceil(len(chapters) / 2)
-
-        for i, chapter in enumerate(chapters):
-            if i < a_length:
-                chapter.position = "a" * (a_length - i) + "z"
-            else:
-                chapter.position = "z" * (i - a_length + 1)
-
-            chapter.save()
 
     def overrides_for_user(self, user: Optional[AbstractUser]) -> bool:
         overrides = {}
@@ -240,21 +375,80 @@ class Post(TimestampModel, SoftDeleteModel, ValidatableModel):
         if self.is_anonymous and (not user or user.id != self.author_id):
             overrides["author"] = None
 
-        if self.subscribers.filter(id=user.id).exists() if user else False:
+        if subscription := self.get_subscription(user):
             overrides["is_subscribed"] = True
 
-        if subscription := self.subscriptions.filter(user=user).first():
-            if comment := subscription.last_comment_seen:
+            if hasattr(subscription, "comments_read"):
+                if subscription.comments_read is not None:
+                    overrides["comments_read"] = subscription.comments_read
+            elif comment := subscription.last_comment_seen:
                 overrides["comments_read"] = comment.count(after=False) + 1
 
         return overrides
 
+    def get_subscription(
+        self, user: Optional[AbstractUser]
+    ) -> Optional["Subscription"]:
+        if not user:
+            return None
+        elif hasattr(self, "user_subscriptions"):
+            return next(
+                (s for s in self.user_subscriptions if s.user_id == user.id), None
+            )
+        else:
+            return self.subscriptions.filter(user=user).first()
+
+    @classmethod
+    def prefetch_messages(
+        cls, posts: models.QuerySet, user: Optional[AbstractUser]
+    ) -> models.QuerySet:
+        seen_date = models.OuterRef("last_comment_seen__date_created")
+        comments_before = Comment.objects.filter(
+            post_id=models.OuterRef("post_id")
+        ).filter(
+            models.Q(date_created__lt=seen_date)
+            | models.Q(
+                date_created=seen_date, id__lt=models.OuterRef("last_comment_seen_id")
+            )
+        )
+        subscriptions = Subscription.objects.filter(user=user).annotate(
+            comments_read=models.Case(
+                models.When(last_comment_seen__isnull=True, then=models.Value(None)),
+                default=Coalesce(count_subquery(comments_before), 0) + 1,
+                output_field=models.IntegerField(),
+            )
+        )
+        return (
+            posts.select_related("author")
+            .prefetch_related(
+                "chapters",
+                models.Prefetch(
+                    "subscriptions",
+                    queryset=subscriptions,
+                    to_attr="user_subscriptions",
+                ),
+            )
+            .annotate(
+                prefetched_vote_count=Coalesce(
+                    count_subquery(Vote.objects.filter(post_id=models.OuterRef("id"))),
+                    0,
+                ),
+                prefetched_comment_count=Coalesce(
+                    count_subquery(
+                        Comment.existing_objects.filter(post_id=models.OuterRef("id"))
+                    ),
+                    0,
+                ),
+            )
+        )
+
 
 class Chapter(ValidatableModel):
     class Meta:
         unique_together = ["post", "position"]
         ordering = unique_together
 
+    MAX_POSITION_LENGTH = 12
     default_message_class = post_pb2.Chapter
 
     post = models.ForeignKey(
@@ -311,37 +505,153 @@ class Stack(UUIDModel):
     user = models.OneToOneField(
         to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="%(class)s"
     )
-    posts = models.ManyToManyField(to=Post, related_name="+", through="Visibility")
+    post_ids = models.BinaryField(default=b"")
     date_last_filled = models.DateTimeField(auto_now=True)
+    voted_filter = models.BinaryField(default=b"")
+    previous_voted_filter = models.BinaryField(default=b"")
+    date_voted_filter_rotated = models.DateTimeField(default=now)
+
+    @property
+    def posts(self) -> models.QuerySet:
+        return Post.existing_objects.filter(id__in=self.get_post_ids())
 
     def __str__(self) -> str:
         return str(self.user)
 
-    @atomic
-    def fill(self):
-        posts_count = self.posts.count()
+    @staticmethod
+    def unpack_post_ids(data: bytes) -> list[UUID]:
+        data = bytes(data)
+        return [UUID(bytes=data[i : i + 16]) for i in range(0, len(data), 16)]
 
-        if posts_count >= self.MAX_SIZE:
-            return
+    def get_post_ids(self) -> list[UUID]:
+        return self.unpack_post_ids(self.post_ids)
+
+    def set_post_ids(self, post_ids: Iterable[UUID]):
+        self.post_ids = b"".join(post_id.bytes for post_id in post_ids)
+
+    def remove_posts(self, post_ids: Iterable[UUID]):
+        removed_ids = set(post_ids)
+        self.set_post_ids(i for i in self.get_post_ids() if i not in removed_ids)
+        self.save(update_fields=["post_ids"])
 
-        post_ids = (
-            Post.active_objects.select_for_update()
-            .exclude(author=self.user)
-            .exclude(author__in=self.user.blocked_users.values("id"))
-            .exclude(author__in=self.user.blocking_users.values("id"))
-            .exclude(voters=self.user)
-            .order_by("date_published")
-            .values_list("id", flat=True)[: self.MAX_SIZE]
+    def voted_filters(self) -> list[BloomFilter]:
+        return [
+            BloomFilter(
+                data,
+                size=settings.FYREPLACE_VOTED_FILTER_SIZE,
+                hashes=settings.FYREPLACE_VOTED_FILTER_HASHES,
+            )
+            for data in (self.voted_filter, self.previous_voted_filter)
+            if len(data) > 0
+        ]
+
+    def record_votes(self, post_ids: Iterable[UUID]):
+        if (
+            now() - self.date_voted_filter_rotated
+            >= settings.FYREPLACE_POST_MAX_DURATION
+        ):
+            self.previous_voted_filter = self.voted_filter
+            self.voted_filter = b""
+            self.date_voted_filter_rotated = now()
+
+        voted_filter = BloomFilter(
+            self.voted_filter,
+            size=settings.FYREPLACE_VOTED_FILTER_SIZE,
+            hashes=settings.FYREPLACE_VOTED_FILTER_HASHES,
         )
-        current_post_ids = list(self.posts.values_list("id", flat=True))
-        self.posts.set(post_ids)
-        self.posts.exclude(id__in=current_post_ids).update(life=models.F("life") - 1)
-        self.save()
+
+        for post_id in post_ids:
+            voted_filter.add(post_id.bytes)
+
+        self.voted_filter = bytes(voted_filter)
+        self.save(
+            update_fields=[
+                "voted_filter",
+                "previous_voted_filter",
+                "date_voted_filter_rotated",
+            ]
+        )
+
+    @atomic
+    def fill(self, excluded_post_ids: Iterable[UUID] = ()):
+        excluded_post_ids = set(excluded_post_ids)
+        current_post_ids = set(self.get_post_ids()) - excluded_post_ids
+        self.set_post_ids(self.select_post_ids(current_post_ids, excluded_post_ids))
+        self.save(update_fields=["post_ids", "date_last_filled"])
 
     @atomic
     def drain(self):
-        self.posts.update(life=models.F("life") + 1)
-        self.posts.clear()
+        post_ids = list(
+            Post.existing_objects.filter(id__in=self.get_post_ids()).values_list(
+                "id", flat=True
+            )
+        )
+        self.set_post_ids([])
+        self.save(update_fields=["post_ids"])
+
+        for post_id in post_ids:
+            Post.add_life(post_id, 1)
+
+    def select_post_ids(
+        self,
+        current_post_ids: set[UUID],
+        excluded_post_ids: Optional[set[UUID]] = None,
+    ) -> list[UUID]:
+        excluded_post_ids = excluded_post_ids or set()
+        excluded_author_ids = {self.user_id}
+        post_ids = []
+
+        for block in Block.objects.filter(
+            models.Q(issuer_id=self.user_id) | models.Q(target_id=self.user_id)
+        ).values_list("issuer_id", "target_id"):
+            excluded_author_ids.update(block)
+
+        voted_filters = self.voted_filters()
+
+        for candidates in get_candidate_pool().batches(self.MAX_SIZE):
+            candidates = [
+                c
+                for c in candidates
+                if (c.life > 0 or c.id in current_post_ids)
+                and c.author_id not in excluded_author_ids
+            ]
+            maybe_voted_ids = [
+                c.id for c in candidates if any(c.id.bytes in f for f in voted_filters)
+            ]
+            voted_ids = (
+                set(
+                    Vote.objects.filter(
+                        user_id=self.user_id, post_id__in=maybe_voted_ids
+                    ).values_list("post_id", flat=True)
+                )
+                if maybe_voted_ids
+                else set()
+            )
+            eligible_ids = [
+                c.id
+                for c in candidates
+                if c.id not in voted_ids and c.id not in excluded_post_ids
+            ]
+
+            while eligible_ids and len(post_ids) < self.MAX_SIZE:
+                remaining = self.MAX_SIZE - len(post_ids)
+                attempted_ids = eligible_ids[:remaining]
+                eligible_ids = eligible_ids[remaining:]
+                consumed_ids = {
+                    post_id
+                    for post_id in sorted(set(attempted_ids) - current_post_ids)
+                    if Post.consume_life(post_id)
+                }
+                post_ids += [
+                    post_id
+                    for post_id in attempted_ids
+                    if post_id in current_post_ids or post_id in consumed_ids
+                ]
+
+            if len(post_ids) >= self.MAX_SIZE:
+                break
+
+        return post_ids
 
 
 class Vote(UUIDModel):
@@ -359,21 +669,89 @@ class Vote(UUIDModel):
         return f"{self.user}, {self.post}: {self.spread}"
 
 
-class Visibility(UUIDModel):
+class LifeDelta(UUIDModel):
     class Meta:
-        unique_together = ["stack", "post"]
+        unique_together = ["post", "shard"]
         ordering = unique_together
 
-    stack = models.ForeignKey(to=Stack, on_delete=models.CASCADE, related_name="+")
+    SHARDS = 8
+
     post = models.ForeignKey(to=Post, on_delete=models.CASCADE, related_name="+")
+    shard = models.PositiveSmallIntegerField()
+    delta = models.IntegerField(default=0)
 
     def __str__(self) -> str:
-        return f"{self.stack}, {self.post}"
+        return f"{self.post} [{self.shard}]: {self.delta}"
+
+    @classmethod
+    def pending_for(cls, post_ref: str) -> models.QuerySet:
+        return (
+            cls.objects.filter(post_id=models.OuterRef(post_ref))
+            .values("post_id")
+            .annotate(total=models.Sum("delta"))
+            .values("total")
+        )
+
+    @classmethod
+    def consume(cls, post_id: Any) -> bool:
+        if not Post.active_objects.filter(id=post_id).exists():
+            return False
+
+        cls.record(post_id, -1)
+        return True
+
+    @classmethod
+    def record(cls, post_id: Any, amount: int):
+        shard = randrange(cls.SHARDS)
+        shard_deltas = cls.objects.filter(post_id=post_id, shard=shard)
+
+        if shard_deltas.update(delta=models.F("delta") + amount) > 0:
+            return
+
+        try:
+            with atomic():
+                cls.objects.create(post_id=post_id, shard=shard, delta=amount)
+        except IntegrityError:
+            shard_deltas.update(delta=models.F("delta") + amount)
+
+    @classmethod
+    @atomic
+    def record_many(cls, amounts: dict[Any, int]):
+        if not amounts:
+            return
+
+        shard = randrange(cls.SHARDS)
+        post_ids_by_amount = defaultdict(list)
+
+        for post_id, amount in amounts.items():
+            post_ids_by_amount[amount].append(post_id)
+
+        cls.objects.bulk_create(
+            [cls(post_id=post_id, shard=shard) for post_id in amounts],
+            ignore_conflicts=True,
+        )
+        cls.objects.filter(post_id__in=amounts, shard=shard).update(
+            delta=models.F("delta")
+            + models.Case(
+                *[
+                    models.When(post_id__in=post_ids, then=models.Value(amount))
+                    for amount, post_ids in post_ids_by_amount.items()
+                ],
+                default=models.Value(0),
+            )
+        )
 
 
 class Comment(UUIDModel, TimestampModel, SoftDeleteModel):
     class Meta:
         ordering = ["date_created", "id"]
+        indexes = [
+            models.Index(
+                fields=["post", "date_created"],
+                condition=models.Q(is_deleted=False),
+                name="posts_comment_existing_idx",
+            )
+        ]
 
     objects = models.Manager()
     existing_objects = ExistingManager()
@@ -428,6 +806,10 @@ class Comment(UUIDModel, TimestampModel, SoftDeleteModel):
         self.text = ""
         super().perform_soft_delete()
 
+    @classmethod
+    def perform_bulk_soft_delete(cls, pks: list[Any]):
+        cls.objects.filter(pk__in=pks).update(is_deleted=True, text="")
+
 
 class Subscription(UUIDModel):
     class Meta:
@@ -444,6 +826,7 @@ class Subscription(UUIDModel):
         to=Comment, on_delete=models.SET_NULL, related_name="+", null=True
     )
     date_last_seen = models.DateTimeField(auto_now=True)
+    date_acknowledgement_scheduled = models.DateTimeField(null=True)
 
     def __str__(self) -> str:
         return f"{self.user}, {self.post}"
@@ -0,0 +1,273 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from functools import cache
+from threading import Lock
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
+from uuid import UUID
+
+from django.conf import settings
+from django.db import models
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+from redis import Redis
+
+
+class Candidate(NamedTuple):
+    id: UUID
+    author_id: UUID
+    date_published: datetime
+    life: int
+
+
+class CandidatePool(ABC):
+    def __init__(self):
+        self.date_loaded: Optional[datetime] = None
+
+    @property
+    def deadline(self) -> datetime:
+        return now() - settings.FYREPLACE_POST_MAX_DURATION
+
+    def add(self, post: Any):
+        self.add_candidates(
+            [Candidate(post.id, post.author_id, post.date_published, post.life)]
+        )
+
+    def batches(self, size: int) -> Iterator[list[Candidate]]:
+        if self.needs_loading():
+            self.load()
+
+        self.prune()
+        return self.iterate(size)
+
+    def needs_loading(self) -> bool:
+        return (
+            self.date_loaded is None
+            or now() - self.date_loaded > settings.FYREPLACE_CANDIDATE_POOL_REFRESH
+        )
+
+    def load(self):
+        from .models import Post
+
+        self.reset(
+            Candidate(*values)
+            for values in Post.active_objects.annotate(
+                current_life=models.F("effective_life")
+            ).values_list("id", "author_id", "date_published", "current_life")
+        )
+        self.date_loaded = now()
+
+    @abstractmethod
+    def add_candidates(self, candidates: Iterable[Candidate]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_life(self, post_id: UUID, amount: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def reserve_life(self, post_id: UUID) -> Optional[bool]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def discard(self, post_id: UUID):
+        raise NotImplementedError
+
+    @abstractmethod
+    def prune(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iterate(self, size: int) -> Iterator[list[Candidate]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def reset(self, candidates: Iterable[Candidate]):
+        raise NotImplementedError
+
+
+class LocalCandidatePool(CandidatePool):
+    def __init__(self):
+        super().__init__()
+        self._lock = Lock()
+        self._order: list[tuple[datetime, UUID]] = []
+        self._entries: dict[UUID, Candidate] = {}
+
+    def add_candidates(self, candidates: Iterable[Candidate]):
+        with self._lock:
+            for candidate in candidates:
+                self._remove(candidate.id)
+                self._entries[candidate.id] = candidate
+                insort(self._order, (candidate.date_published, candidate.id))
+
+    def update_life(self, post_id: UUID, amount: int):
+        with self._lock:
+            if candidate := self._entries.get(post_id):
+                self._entries[post_id] = candidate._replace(
+                    life=candidate.life + amount
+                )
+
+    def reserve_life(self, post_id: UUID) -> Optional[bool]:
+        with self._lock:
+            if not (candidate := self._entries.get(post_id)):
+                return None
+            elif candidate.life <= 0:
+                return False
+
+            self._entries[post_id] = candidate._replace(life=candidate.life - 1)
+            return True
+
+    def discard(self, post_id: UUID):
+        with self._lock:
+            self._remove(post_id)
+
+    def prune(self):
+        with self._lock:
+            expired_count = bisect_left(self._order, (self.deadline,))
+
+            for _, post_id in self._order[:expired_count]:
+                del self._entries[post_id]
+
+            del self._order[:expired_count]
+
+    def iterate(self, size: int) -> Iterator[list[Candidate]]:
+        last_key = None
+
+        while True:
+            with self._lock:
+                start = 0 if last_key is None else bisect_right(self._order, last_key)
+                keys = self._order[start : start + size]
+                candidates = [self._entries[post_id] for _, post_id in keys]
+
+            if not candidates:
+                return
+
+            yield candidates
+            last_key = keys[-1]
+
+    def reset(self, candidates: Iterable[Candidate]):
+        candidates = list(candidates)
+
+        with self._lock:
+            self._entries = {c.id: c for c in candidates}
+            self._order = sorted((c.date_published, c.id) for c in candidates)
+
+    def _remove(self, post_id: UUID):
+        if candidate := self._entries.pop(post_id, None):
+            key = (candidate.date_published, candidate.id)
+            index = bisect_left(self._order, key)
+
+            if index < len(self._order) and self._order[index] == key:
+                del self._order[index]
+
+
+class RedisCandidatePool(CandidatePool):
+    RESERVE_LIFE_SCRIPT = """
+    local life = redis.call("HGET", KEYS[1], ARGV[1])
+
+    if not life then
+        return -1
+    elseif tonumber(life) <= 0 then
+        return 0
+    end
+
+    redis.call("HINCRBY", KEYS[1], ARGV[1], -1)
+    return 1
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.redis = Redis.from_url(settings.REDIS_URL)
+        self.key = f"{settings.APP_NAME}:posts:pool"
+        self.life_key = self.key + ":life"
+        self.authors_key = self.key + ":authors"
+        self.loaded_key = self.key + ":loaded"
+        self.reserve_life_script = self.redis.register_script(self.RESERVE_LIFE_SCRIPT)
+
+    def needs_loading(self) -> bool:
+        if self.redis.exists(self.loaded_key):
+            return False
+
+        refresh = settings.FYREPLACE_CANDIDATE_POOL_REFRESH
+        return bool(self.redis.set(self.loaded_key, 1, nx=True, ex=refresh))
+
+    def add_candidates(self, candidates: Iterable[Candidate]):
+        with self.redis.pipeline() as pipeline:
+            self._write(pipeline, "", candidates)
+            pipeline.execute()
+
+    def update_life(self, post_id: UUID, amount: int):
+        member = str(post_id)
+
+        if self.redis.hexists(self.life_key, member):
+            self.redis.hincrby(self.life_key, member, amount)
+
+    def reserve_life(self, post_id: UUID) -> Optional[bool]:
+        result = self.reserve_life_script(keys=[self.life_key], args=[str(post_id)])
+        return None if result < 0 else bool(result)
+
+    def discard(self, post_id: UUID):
+        self._remove([str(post_id)])
+
+    def prune(self):
+        deadline = self.deadline.timestamp()
+
+        if expired := self.redis.zrangebyscore(self.key, "-inf", f"({deadline}"):
+            self._remove([member.decode() for member in expired])
+
+    def iterate(self, size: int) -> Iterator[list[Candidate]]:
+        cursor = 0
+
+        while members := self.redis.zrange(
+            self.key, cursor, cursor + size - 1, withscores=True
+        ):
+            ids = [member.decode() for member, _ in members]
+            lives = self.redis.hmget(self.life_key, ids)
+            authors = self.redis.hmget(self.authors_key, ids)
+            yield [
+                Candidate(
+                    UUID(post_id),
+                    UUID(author_id.decode()),
+                    datetime.fromtimestamp(score, timezone.utc),
+                    int(life),
+                )
+                for post_id, (_, score), life, author_id in zip(
+                    ids, members, lives, authors
+                )
+                if life is not None and author_id is not None
+            ]
+            cursor += size
+
+    def reset(self, candidates: Iterable[Candidate]):
+        keys = (self.key, self.life_key, self.authors_key)
+
+        with self.redis.pipeline() as pipeline:
+            pipeline.delete(*(key + ":next" for key in keys))
+            self._write(pipeline, ":next", candidates)
+            pipeline.delete(*keys)
+
+            for key in keys:
+                pipeline.rename(key + ":next", key)
+
+            pipeline.execute(raise_on_error=False)
+
+    def _write(self, pipeline: Any, suffix: str, candidates: Iterable[Candidate]):
+        for candidate in candidates:
+            member = str(candidate.id)
+            pipeline.zadd(
+                self.key + suffix, {member: candidate.date_published.timestamp()}
+            )
+            pipeline.hset(self.life_key + suffix, member, candidate.life)
+            pipeline.hset(self.authors_key + suffix, member, str(candidate.author_id))
+
+    def _remove(self, members: list[str]):
+        with self.redis.pipeline() as pipeline:
+            pipeline.zrem(self.key, *members)
+            pipeline.hdel(self.life_key, *members)
+            pipeline.hdel(self.authors_key, *members)
+            pipeline.execute()
+
+
+@cache
+def get_candidate_pool() -> CandidatePool:
+    return import_string(settings.FYREPLACE_CANDIDATE_POOL)()
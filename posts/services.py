@@ -2,8 +2,10 @@ from typing import Iterator
 from uuid import UUID
 
 import grpc
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import DatabaseError
 from django.db.transaction import atomic
 from django.utils.timezone import now
 from google.protobuf import empty_pb2
@@ -13,10 +15,7 @@ from core.authentication import no_auth
 from core.pagination import PaginatorMixin
 from core.services import ImageUploadMixin
 from notifications.models import Flag, remove_notifications_for
-from notifications.tasks import (
-    send_notifications,
-    send_remote_notifications_comment_acknowledgement,
-)
+from notifications.tasks import acknowledge_comments
 from protos import (
     comment_pb2,
     comment_pb2_grpc,
@@ -27,13 +26,15 @@ from protos import (
     post_pb2_grpc,
 )
 
-from .models import Chapter, Comment, Post, Stack, Subscription, Vote
+from .feeds import get_anonymous_feed, prefetch
+from .models import Chapter, Comment, Post, Stack, Subscription
 from .pagination import (
     ArchiveSubscriptionsPaginationAdapter,
     CommentsPaginationAdapter,
     DraftsPaginationAdapter,
     OwnPostsPaginationAdapter,
 )
+from .votes import VoteBuffer
 
 
 class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
@@ -43,73 +44,95 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
     ) -> Iterator[post_pb2.Post]:
         posts = []
         fetch_after = None
+        votes = VoteBuffer(context.caller.id) if context.caller else None
+        prepared_posts = None
+
+        def load_stack(
+            current_ids: set[UUID], voted_ids: set[UUID]
+        ) -> list[post_pb2.Post]:
+            with atomic():
+                stack = Stack.objects.select_for_update().get(user_id=context.caller.id)
+                stack.fill(excluded_post_ids=voted_ids)
+
+            new_ids = set(stack.get_post_ids()) - current_ids - voted_ids
+            return [
+                p.to_message(context=context, **p.overrides_for_user(context.caller))
+                for p in Post.existing_objects.filter(id__in=new_ids)
+                .order_by("date_published")
+                .select_related()
+            ]
+
+        def prepare_stack():
+            nonlocal prepared_posts
+            votes.flush()
+            prepared_posts = prefetch(
+                load_stack, {UUID(bytes=p.id) for p in posts}, set(votes.voted_ids)
+            )
 
         def refill_stack():
             nonlocal posts
             nonlocal fetch_after
+            nonlocal prepared_posts
 
             if context.caller:
-                with atomic():
-                    stack = Stack.objects.select_for_update().get(
-                        id=context.caller.stack.id
+                if prepared_posts is None:
+                    prepare_stack()
+
+                try:
+                    new_posts = prepared_posts.result()
+                except DatabaseError:
+                    votes.flush()
+                    new_posts = load_stack(
+                        {UUID(bytes=p.id) for p in posts}, votes.voted_ids
                     )
-                    stack.fill()
 
-                current_ids = [str(p.id) for p in posts]
-                new_posts = context.caller.stack.posts.exclude(id__in=current_ids)
-            elif fetch_after:
-                new_posts = Post.active_objects.filter(date_published__gt=fetch_after)
+                prepared_posts = None
+                current_ids = {p.id for p in posts}
+                posts += [
+                    p
+                    for p in new_posts
+                    if p.id not in current_ids
+                    and UUID(bytes=p.id) not in votes.voted_ids
+                ]
             else:
-                new_posts = Post.active_objects.all()
-
-            new_posts = new_posts.order_by("date_published")
-
-            if not context.caller:
-                new_posts = new_posts[: Stack.MAX_SIZE]
-
-            new_posts = list(new_posts.select_related())
-
-            if len(new_posts) > 0:
-                fetch_after = new_posts[-1].date_published
+                entries = get_anonymous_feed().entries_after(
+                    fetch_after, Stack.MAX_SIZE
+                )
 
-            posts += new_posts
+                if len(entries) > 0:
+                    fetch_after = entries[-1][0]
 
-        refill_stack()
+                posts += [message for _, message in entries]
 
-        if len(posts) == 0:
-            return
+        try:
+            refill_stack()
 
-        yield from (
-            p.to_message(context=context, **p.overrides_for_user(context.caller))
-            for p in posts[:3]
-        )
+            if len(posts) == 0:
+                return
 
-        for request in request_iterator:
-            if context.caller:
-                if request.post_id not in (p.id.bytes for p in posts[:3]):
-                    raise InvalidArgument("post_not_in_feed")
+            yield from posts[:3]
 
-                _, created = Vote.objects.get_or_create(
-                    user=context.caller,
-                    post_id=UUID(bytes=request.post_id),
-                    defaults={"spread": request.spread},
-                )
+            for request in request_iterator:
+                if context.caller:
+                    if request.post_id not in (p.id for p in posts[:3]):
+                        raise InvalidArgument("post_not_in_feed")
 
-                if not created:
-                    raise PermissionDenied("post_already_voted")
+                    votes.add(UUID(bytes=request.post_id), request.spread)
 
-            posts = [p for p in posts if p.id.bytes != request.post_id]
+                posts = [p for p in posts if p.id != request.post_id]
 
-            if len(posts) == 0:
-                return
-            elif len(posts) < 3:
-                refill_stack()
+                if len(posts) == 0:
+                    return
+                elif len(posts) < 3:
+                    refill_stack()
+                elif context.caller and len(posts) <= 5 and prepared_posts is None:
+                    prepare_stack()
 
-            if len(posts) >= 3:
-                post = posts[2]
-                yield post.to_message(
-                    context=context, **post.overrides_for_user(context.caller)
-                )
+                if len(posts) >= 3:
+                    yield posts[2]
+        finally:
+            if votes:
+                votes.flush()
 
     def ListArchive(
         self,
@@ -237,7 +260,7 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
         Flag.objects.get_or_create(
             issuer=context.caller,
             target_type=ContentType.objects.get_for_model(Post),
-            target_id=str(post.id),
+            target_id=post.id,
         )
         return empty_pb2.Empty()
 
@@ -401,15 +424,24 @@ class CommentService(PaginatorMixin, comment_pb2_grpc.CommentServiceServicer):
             .update(last_comment_seen=comment)
         )
 
-        if updated_count > 0:
-            (
-                send_notifications.si(
-                    comment_id=str(comment.id), new_notifications=False
-                )
-                | send_remote_notifications_comment_acknowledgement.si(
-                    comment_id=str(comment.id), user_id=str(context.caller.id)
-                )
-            ).delay()
+        debounce = settings.FYREPLACE_ACKNOWLEDGEMENT_DEBOUNCE
+
+        scheduled_count = (
+            Subscription.objects.filter(user=context.caller, post_id=comment.post_id)
+            .exclude(date_acknowledgement_scheduled__gt=now() - 2 * debounce)
+            .update(date_acknowledgement_scheduled=now())
+            if updated_count > 0
+            else 0
+        )
+
+        if scheduled_count > 0:
+            acknowledge_comments.apply_async(
+                kwargs={
+                    "post_id": str(comment.post_id),
+                    "user_id": str(context.caller.id),
+                },
+                countdown=debounce.total_seconds(),
+            )
 
         return empty_pb2.Empty()
 
@@ -426,7 +458,7 @@ class CommentService(PaginatorMixin, comment_pb2_grpc.CommentServiceServicer):
         Flag.objects.get_or_create(
             issuer=context.caller,
             target_type=ContentType.objects.get_for_model(Comment),
-            target_id=str(comment.id),
+            target_id=comment.id,
         )
         return empty_pb2.Empty()
 
@@ -1,28 +1,31 @@
+from typing import Any
+
 from django.conf import settings
 from django.db import IntegrityError
-from django.db.models import F
 from django.db.models.signals import post_delete, post_save, pre_save
 from django.db.transaction import atomic
 from django.dispatch import receiver
 
-from core.signals import post_soft_delete
-from notifications.tasks import (
-    send_notifications,
-    send_remote_notifications_comment_change,
-)
+from core.signals import post_bulk_soft_delete, post_soft_delete
+from notifications.tasks import send_comment_notifications
 
-from .models import Chapter, Comment, Post, Subscription, Vote
+from .models import Chapter, Comment, Post, Stack, Subscription, Vote
 from .tasks import remove_post_data
 
 
 @receiver(post_soft_delete, sender=Post)
 def on_post_post_soft_delete(instance: Post, **kwargs):
-    remove_post_data.delay(post_id=str(instance.id))
+    remove_post_data.delay(post_ids=[str(instance.id)])
+
+
+@receiver(post_bulk_soft_delete, sender=Post)
+def on_post_post_bulk_soft_delete(pks: list[Any], **kwargs):
+    remove_post_data.delay(post_ids=[str(pk) for pk in pks])
 
 
 @receiver(post_save, sender=Chapter)
 def on_chapter_post_save(instance: Chapter, **kwargs):
-    if len(instance.position) > 30:
+    if len(instance.position) > Chapter.MAX_POSITION_LENGTH:
         instance.post.normalize_chapters()
 
 
@@ -42,18 +45,30 @@ def on_comment_post_save(instance: Comment, created: bool, **kwargs):
             defaults={"last_comment_seen": instance},
         )
 
-        (
-            send_notifications.si(comment_id=str(instance.id), new_notifications=True)
-            | send_remote_notifications_comment_change.si(comment_id=str(instance.id))
-        ).delay()
+        send_comment_notifications.delay(
+            comment_id=str(instance.id), new_notifications=True
+        )
 
 
 @receiver(post_soft_delete, sender=Comment)
 def on_comment_post_soft_delete(instance: Comment, **kwargs):
-    (
-        send_notifications.si(comment_id=str(instance.id), new_notifications=False)
-        | send_remote_notifications_comment_change.si(comment_id=str(instance.id))
-    ).delay()
+    send_comment_notifications.delay(
+        comment_id=str(instance.id), new_notifications=False
+    )
+
+
+@receiver(post_bulk_soft_delete, sender=Comment)
+def on_comment_post_bulk_soft_delete(pks: list[Any], **kwargs):
+    last_comment_ids = dict(
+        Comment.objects.filter(pk__in=pks)
+        .order_by("date_created")
+        .values_list("post_id", "id")
+    )
+
+    for comment_id in last_comment_ids.values():
+        send_comment_notifications.delay(
+            comment_id=str(comment_id), new_notifications=False
+        )
 
 
 @receiver(pre_save, sender=Vote)
@@ -69,8 +84,8 @@ def on_vote_post_save(instance: Vote, created: bool, **kwargs):
         return
 
     if instance.spread:
-        Post.objects.filter(id=instance.post_id).update(
-            life=F("life") + settings.FYREPLACE_POST_SPREAD_LIFE
-        )
+        Post.add_life(instance.post_id, settings.FYREPLACE_POST_SPREAD_LIFE)
 
-    instance.user.stack.posts.remove(instance.post)
+    stack = Stack.objects.select_for_update().get(user_id=instance.user_id)
+    stack.record_votes([instance.post_id])
+    stack.remove_posts([instance.post_id])
@@ -1,49 +1,144 @@
+from collections import Counter, defaultdict
 from datetime import timedelta
+from hashlib import sha256
+from typing import Optional, Sequence
+from uuid import UUID
 
 from celery import shared_task
+from django.conf import settings
+from django.db import models
+from django.db.models.functions import Greatest
 from django.db.transaction import atomic
 from django.utils.timezone import now
 
-from .models import Chapter, Comment, Post, Stack, Visibility
+from core.purge import purge, purge_delete, purge_soft_delete
+
+from .models import Chapter, Comment, LifeDelta, Post, Stack, Vote
 
 
 @shared_task
-def cleanup_stacks():
-    deadline = now() - timedelta(days=1)
+def cleanup_stacks(chunk_size: int = 1000):
+    def drain(stack_ids: list[str]):
+        drained = list(
+            Stack.objects.filter(id__in=stack_ids)
+            .exclude(post_ids=b"")
+            .select_for_update(skip_locked=True)
+            .values_list("id", "post_ids")
+        )
+        Stack.objects.filter(id__in=[id for id, _ in drained]).update(post_ids=b"")
+        Post.add_lives(
+            Counter(
+                post_id
+                for _, post_ids in drained
+                for post_id in Stack.unpack_post_ids(post_ids)
+            )
+        )
+
+    purge(
+        "posts:cleanup_stacks",
+        Stack.objects.filter(date_last_filled__lte=now() - timedelta(days=1)).exclude(
+            post_ids=b""
+        ),
+        drain,
+        chunk_size=chunk_size,
+    )
 
-    while stack_ids := Stack.objects.filter(
-        date_last_filled__lte=deadline, posts__isnull=False
-    ).values("id"):
-        stacks = Stack.objects.select_for_update().filter(id__in=stack_ids)
 
+@shared_task
+def cleanup_expired_posts():
+    deadline = now() - settings.FYREPLACE_POST_MAX_DURATION
+
+    while post_ids := list(
+        Post.published_objects.filter(date_published__lt=deadline)
+        .filter(
+            models.Q(life__gt=0) | models.Q(id__in=LifeDelta.objects.values("post_id"))
+        )
+        .values_list("id", flat=True)[:1000]
+    ):
         with atomic():
-            for stack in stacks[:100]:
-                stack.drain()
+            Post.objects.filter(id__in=post_ids).update(life=0)
+            LifeDelta.objects.filter(post_id__in=post_ids).delete()
 
 
 @shared_task
-def remove_post_data_for_user(user_id: str):
-    while post_ids := Post.objects.filter(author_id=user_id, is_deleted=False).values(
-        "id"
+@atomic
+def apply_votes(user_id: str, votes: dict[str, bool]):
+    stack = Stack.objects.select_for_update().get(user_id=user_id)
+    voted_ids = set(
+        Vote.objects.filter(user_id=user_id, post_id__in=votes).values_list(
+            "post_id", flat=True
+        )
+    )
+    new_votes = [
+        Vote(user_id=user_id, post_id=post_id, spread=votes[str(post_id)])
+        for post_id in Post.published_objects.filter(id__in=votes)
+        .exclude(author_id=user_id)
+        .values_list("id", flat=True)
+        if post_id not in voted_ids
+    ]
+    Vote.objects.bulk_create(new_votes, ignore_conflicts=True)
+    stack.record_votes(vote.post_id for vote in new_votes)
+    stack.remove_posts(UUID(post_id) for post_id in votes)
+
+    for vote in new_votes:
+        if vote.spread:
+            Post.add_life(vote.post_id, settings.FYREPLACE_POST_SPREAD_LIFE)
+
+
+@shared_task
+def flush_post_life(chunk_size: int = 500):
+    last_post_id = LifeDelta.objects.aggregate(last=models.Max("post_id"))["last"]
+
+    if last_post_id is None:
+        return
+
+    pending = LifeDelta.objects.filter(post_id__lte=last_post_id).order_by("post_id")
+
+    while post_ids := list(
+        pending.values_list("post_id", flat=True).distinct()[:chunk_size]
     ):
-        posts = Post.objects.select_for_update().filter(id__in=post_ids)
+        pending = pending.filter(post_id__gt=post_ids[-1])
 
         with atomic():
-            for post in posts[:100]:
-                post.soft_delete()
+            deltas = list(
+                LifeDelta.objects.select_for_update()
+                .filter(post_id__in=post_ids)
+                .values_list("id", "post_id", "delta")
+            )
+            totals = defaultdict(int)
 
-    while comment_ids := Comment.objects.filter(
-        author_id=user_id, is_deleted=False
-    ).values("id"):
-        comments = Comment.objects.select_for_update().filter(id__in=comment_ids)
+            for _, post_id, delta in deltas:
+                totals[post_id] += delta
 
-        with atomic():
-            for comment in comments[:100]:
-                comment.soft_delete()
+            Post.objects.filter(id__in=totals).update(
+                life=Greatest(
+                    models.F("life")
+                    + models.Case(
+                        *[
+                            models.When(id=post_id, then=models.Value(total))
+                            for post_id, total in totals.items()
+                        ],
+                        default=models.Value(0),
+                    ),
+                    models.Value(0),
+                )
+            )
+            LifeDelta.objects.filter(id__in=[id for id, _, _ in deltas]).delete()
 
 
 @shared_task
-def remove_post_data(post_id: str):
-    Chapter.objects.filter(post_id=post_id).delete()
-    Comment.objects.filter(post_id=post_id).delete()
-    Visibility.objects.filter(post__is_deleted=True).delete()
+def remove_post_data_for_user(user_id: str):
+    purge_soft_delete(f"posts:{user_id}:posts", Post.objects.filter(author_id=user_id))
+    purge_soft_delete(
+        f"posts:{user_id}:comments", Comment.objects.filter(author_id=user_id)
+    )
+
+
+@shared_task
+def remove_post_data(post_ids: Sequence[str] = (), post_id: Optional[str] = None):
+    if post_id is not None:
+        post_ids = [*post_ids, post_id]
+
+    scope = sha256(",".join(sorted(post_ids)).encode()).hexdigest()
+    purge_delete(f"chapters:{scope}", Chapter.objects.filter(post_id__in=post_ids))
+    purge_delete(f"comments:{scope}", Comment.objects.filter(post_id__in=post_ids))
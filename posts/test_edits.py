@@ -0,0 +1,99 @@
+from django.core.exceptions import ObjectDoesNotExist
+from grpc_interceptor.exceptions import PermissionDenied
+
+from protos import post_pb2
+
+from .edits import ChapterOperation, edit_chapters
+from .models import Chapter, Post
+from .tests import BasePostTestCase
+
+
+class EditChapters(BasePostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chapters = [
+            Chapter.objects.create(
+                post=self.post, position=self.post.chapter_position(i), text="Text"
+            )
+            for i in range(3)
+        ]
+        self.post_id = self.post.id.bytes
+
+    def test(self):
+        errors = edit_chapters(
+            self.main_user,
+            self.post_id,
+            [
+                ChapterOperation(
+                    "UpdateText",
+                    post_pb2.ChapterTextUpdate(
+                        location=post_pb2.ChapterLocation(position=0), text="First"
+                    ),
+                ),
+                ChapterOperation(
+                    "Move", post_pb2.ChapterRelocation(from_position=0, to_position=2)
+                ),
+                ChapterOperation("Create", post_pb2.ChapterLocation(position=0)),
+                ChapterOperation("Delete", post_pb2.ChapterLocation(position=2)),
+            ],
+        )
+        self.assertEqual(errors, [None] * 4)
+        chapters = list(self.post.chapters.all())
+        self.assertEqual(len(chapters), 3)
+        self.assertNotIn(chapters[0].id, [c.id for c in self.chapters])
+        self.assertEqual(chapters[1].id, self.chapters[1].id)
+        self.assertEqual(chapters[2].id, self.chapters[0].id)
+        self.assertEqual(chapters[2].text, "First")
+
+    def test_invalid_operations(self):
+        errors = edit_chapters(
+            self.main_user,
+            self.post_id,
+            [
+                ChapterOperation("Delete", post_pb2.ChapterLocation(position=42)),
+                ChapterOperation(
+                    "UpdateText",
+                    post_pb2.ChapterTextUpdate(
+                        location=post_pb2.ChapterLocation(position=1), text="a" * 501
+                    ),
+                ),
+                ChapterOperation("Unknown", post_pb2.ChapterLocation(position=0)),
+                ChapterOperation("Delete", post_pb2.ChapterLocation(position=0)),
+            ],
+        )
+        self.assertEqual(errors[0], "invalid_position")
+        self.assertIsNotNone(errors[1])
+        self.assertEqual(errors[2], "invalid_operation")
+        self.assertIsNone(errors[3])
+        self.assertEqual(
+            list(self.post.chapters.values_list("id", flat=True)),
+            [c.id for c in self.chapters[1:]],
+        )
+        self.assertEqual(self.post.chapters.first().text, "Text")
+
+    def test_too_many(self):
+        errors = edit_chapters(
+            self.main_user,
+            self.post_id,
+            [
+                ChapterOperation("Create", post_pb2.ChapterLocation(position=0))
+                for _ in range(Post.MAX_CHAPTERS)
+            ],
+        )
+        created = Post.MAX_CHAPTERS - len(self.chapters)
+        self.assertEqual(errors[:created], [None] * created)
+        self.assertEqual(errors[created:], ["too_many_chapters"] * len(self.chapters))
+        self.assertEqual(self.post.chapters.count(), Post.MAX_CHAPTERS)
+
+    def test_published(self):
+        self.post.publish(anonymous=False)
+
+        with self.assertRaises(PermissionDenied):
+            edit_chapters(self.main_user, self.post_id, [])
+
+    def test_other(self):
+        self.post.author = self.other_user
+        self.post.save()
+
+        with self.assertRaises(ObjectDoesNotExist):
+            edit_chapters(self.main_user, self.post_id, [])
@@ -1,3 +1,4 @@
+from random import randrange, seed
 from time import sleep
 from unittest.case import TestCase
 
@@ -9,24 +10,64 @@ from grpc_interceptor.exceptions import InvalidArgument
 
 from core.tests import get_asset
 
-from .models import Chapter, Comment, Post, Vote, position_between
+from .models import (
+    POSITION_DIGITS,
+    Chapter,
+    Comment,
+    LifeDelta,
+    Post,
+    Stack,
+    Vote,
+    position_between,
+)
+from .pools import get_candidate_pool
 from .tests import BaseCommentTestCase, BasePostTestCase, PublishedPostTestCase
 
 
 class PositionBetween(TestCase):
+    def assertBetween(self, before, after):
+        position = position_between(before, after)
+        self.assertTrue(before is None or before < position)
+        self.assertTrue(after is None or position < after)
+        self.assertTrue(set(position) <= set(POSITION_DIGITS))
+        self.assertFalse(position.endswith("0"))
+        return position
+
     def test(self):
-        for data in [
-            (None, None, "z"),
-            ("z", None, "zz"),
-            (None, "z", "az"),
-            ("z", "zz", "zaz"),
-            ("z", "zaz", "zaaz"),
-            ("zaz", "zz", "zazz"),
-            ("az", "z", "azz"),
-            ("azz", "z", "azzz"),
-            ("az", "azz", "azaz"),
+        for before, after in [
+            (None, None),
+            ("z", None),
+            (None, "1"),
+            (None, "01"),
+            ("a", "b"),
+            ("a", "bc"),
+            ("az", "b"),
+            ("9z", "a"),
+            ("zz", "zzz"),
         ]:
-            self.assertEqual(position_between(data[0], data[1]), data[2])
+            self.assertBetween(before, after)
+
+    def test_random(self):
+        seed(0)
+        positions = [self.assertBetween(None, None)]
+
+        for _ in range(2000):
+            i = randrange(len(positions) + 1)
+            before = positions[i - 1] if i > 0 else None
+            after = positions[i] if i < len(positions) else None
+            positions.insert(i, self.assertBetween(before, after))
+
+        self.assertLessEqual(max(len(position) for position in positions), 8)
+
+    def test_adversarial(self):
+        first = last = self.assertBetween(None, None)
+
+        for _ in range(40):
+            first = self.assertBetween(None, first)
+            last = self.assertBetween(last, None)
+
+        self.assertLessEqual(len(first), 20)
+        self.assertLessEqual(len(last), 20)
 
     def test_invalid_argument_type(self):
         with self.assertRaises(TypeError):
@@ -79,22 +120,43 @@ class Post_normalize_chapters(BasePostTestCase):
         chapters = list(self.post.chapters.all())
         self.post.normalize_chapters()
 
-        positions = [
-            "aaaaaz",
-            "aaaaz",
-            "aaaz",
-            "aaz",
-            "az",
-            "z",
-            "zz",
-            "zzz",
-            "zzzz",
-            "zzzzz",
-        ]
+        normalized = list(self.post.chapters.all())
+        self.assertEqual([c.id for c in normalized], [c.id for c in chapters])
+
+        for chapter in normalized:
+            self.assertLessEqual(len(chapter.position), 3)
+            self.assertFalse(chapter.position.endswith("0"))
+
+
+class Post_consume_life(PublishedPostTestCase):
+    def test(self):
+        Post.objects.filter(id=self.post.id).update(life=1)
+        self.assertTrue(Post.consume_life(self.post.id))
+        self.assertFalse(Post.consume_life(self.post.id))
+        self.assertEqual(self.post.effective_life, 0)
+
+    def test_pending_deltas(self):
+        Post.objects.filter(id=self.post.id).update(life=2)
+        LifeDelta.record(self.post.id, -1)
+        self.assertTrue(Post.consume_life(self.post.id))
+        self.assertFalse(Post.consume_life(self.post.id))
+        self.assertEqual(self.post.effective_life, 0)
+
+    def test_deleted(self):
+        self.post.delete()
+        self.assertFalse(Post.consume_life(self.post.id))
+
+    def test_base_life_untouched(self):
+        life = self.post.life
+        self.assertTrue(Post.consume_life(self.post.id))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, life)
+        self.assertEqual(self.post.effective_life, life - 1)
 
-        for i, chapter in enumerate(self.post.chapters.all()):
-            self.assertEqual(chapter.id, chapters[i].id)
-            self.assertEqual(chapter.position, positions[i])
+    def test_pool_exhausted(self):
+        get_candidate_pool().update_life(self.post.id, -self.post.life)
+        self.assertFalse(Post.consume_life(self.post.id))
+        self.assertEqual(self.post.effective_life, self.post.life)
 
 
 class Chapter_validate(BasePostTestCase):
@@ -142,6 +204,30 @@ class Chapter_validate(BasePostTestCase):
         return ImageFile(file=asset, name="image.png")
 
 
+class LifeDelta_record(PublishedPostTestCase):
+    def test(self):
+        for _ in range(LifeDelta.SHARDS * 3):
+            LifeDelta.record(self.post.id, -1)
+
+        self.assertLessEqual(
+            LifeDelta.objects.filter(post_id=self.post.id).count(), LifeDelta.SHARDS
+        )
+        self.assertEqual(
+            self.post.effective_life, self.post.life - LifeDelta.SHARDS * 3
+        )
+
+    def test_inactive(self):
+        LifeDelta.record(self.post.id, -self.post.life)
+        self.assertFalse(Post.active_objects.filter(id=self.post.id).exists())
+
+    def test_pending_life(self):
+        Post.objects.filter(id=self.post.id).update(life=0)
+        LifeDelta.record(self.post.id, 1)
+        self.assertTrue(Post.active_objects.filter(id=self.post.id).exists())
+        self.assertTrue(Post.consume_life(self.post.id))
+        self.assertFalse(Post.active_objects.filter(id=self.post.id).exists())
+
+
 class Stack_fill(PublishedPostTestCase):
     def test(self):
         post_life = self.post.life
@@ -150,7 +236,7 @@ class Stack_fill(PublishedPostTestCase):
         stack = self.other_user.stack
         stack.fill()
         self.assertEqual(stack.posts.count(), 1)
-        self.assertEqual(stack.posts.first().life, post_life - 1)
+        self.assertEqual(stack.posts.first().effective_life, post_life - 1)
         self.assertGreater(stack.date_last_filled, before)
 
     def test_again(self):
@@ -160,6 +246,15 @@ class Stack_fill(PublishedPostTestCase):
         stack.fill()
         self.assertEqual(stack.posts.count(), 1)
 
+    def test_last_life(self):
+        Post.objects.filter(id=self.post.id).update(life=1)
+        get_candidate_pool().update_life(self.post.id, 1 - self.post.life)
+        stack = self.other_user.stack
+        stack.fill()
+        self.assertEqual(stack.get_post_ids(), [self.post.id])
+        stack.fill()
+        self.assertEqual(stack.get_post_ids(), [self.post.id])
+
     def test_completely(self):
         for user in (self.main_user, self.other_user):
             for i in range(15):
@@ -174,6 +269,69 @@ class Stack_fill(PublishedPostTestCase):
         self.assertEqual(stack.posts.count(), 10)
         self.assertEqual(stack.posts.filter(author=self.other_user).count(), 0)
 
+    def test_deleted(self):
+        posts = [self.post] + [
+            Post.objects.create(author=self.main_user, date_published=now(), life=10)
+            for _ in range(Stack.MAX_SIZE - 1)
+        ]
+        stack = self.other_user.stack
+        stack.set_post_ids(p.id for p in posts)
+        stack.save()
+        self.post.delete()
+        stack.fill()
+        self.assertNotIn(self.post.id, stack.get_post_ids())
+
+    def test_voted(self):
+        Vote.objects.create(user=self.other_user, post=self.post, spread=False)
+        stack = Stack.objects.get(user=self.other_user)
+        self.assertTrue(any(self.post.id.bytes in f for f in stack.voted_filters()))
+        stack.fill()
+        self.assertEqual(stack.posts.count(), 0)
+
+    def test_stale_candidate(self):
+        Post.objects.filter(id=self.post.id).update(life=0)
+        stack = self.other_user.stack
+        stack.fill()
+        self.assertEqual(stack.posts.count(), 0)
+        self.assertFalse(
+            any(
+                c.id == self.post.id
+                for batch in get_candidate_pool().batches(Stack.MAX_SIZE)
+                for c in batch
+            )
+        )
+
+
+class Stack_remove_posts(PublishedPostTestCase):
+    def test(self):
+        posts = [self.post] + [
+            Post.objects.create(author=self.main_user, date_published=now(), life=10)
+            for _ in range(2)
+        ]
+        stack = self.other_user.stack
+        stack.set_post_ids(p.id for p in posts)
+        stack.save()
+        stack.remove_posts([posts[1].id])
+        stack.refresh_from_db()
+        self.assertEqual(stack.get_post_ids(), [posts[0].id, posts[2].id])
+
+
+class Stack_record_votes(PublishedPostTestCase):
+    def test(self):
+        stack = self.other_user.stack
+        stack.record_votes([self.post.id])
+        stack.refresh_from_db()
+        self.assertTrue(any(self.post.id.bytes in f for f in stack.voted_filters()))
+
+    def test_rotation(self):
+        stack = self.other_user.stack
+        stack.record_votes([self.post.id])
+        stack.date_voted_filter_rotated -= settings.FYREPLACE_POST_MAX_DURATION
+        stack.record_votes([])
+        current, previous = stack.voted_filters()
+        self.assertNotIn(self.post.id.bytes, current)
+        self.assertIn(self.post.id.bytes, previous)
+
 
 class Stack_drain(PublishedPostTestCase):
     def test(self):
@@ -182,30 +340,28 @@ class Stack_drain(PublishedPostTestCase):
         stack.fill()
         stack.drain()
         self.assertEqual(stack.posts.count(), 0)
-        self.assertEqual(self.post.life, post_life)
+        self.assertEqual(self.post.effective_life, post_life)
 
 
 class Vote_create(PublishedPostTestCase):
     def test_spread(self):
         self.other_user.stack.fill()
-        self.post.refresh_from_db()
-        post_life = self.post.life
+        post_life = self.post.effective_life
         stack_count = self.other_user.stack.posts.count()
         Vote.objects.create(user=self.other_user, post=self.post, spread=True)
-        self.post.refresh_from_db()
         self.assertEqual(
-            self.post.life, post_life + settings.FYREPLACE_POST_SPREAD_LIFE
+            self.post.effective_life, post_life + settings.FYREPLACE_POST_SPREAD_LIFE
         )
+        self.other_user.stack.refresh_from_db()
         self.assertEqual(self.other_user.stack.posts.count(), stack_count - 1)
 
     def test_no_spread(self):
         self.other_user.stack.fill()
-        self.post.refresh_from_db()
-        post_life = self.post.life
+        post_life = self.post.effective_life
         stack_count = self.other_user.stack.posts.count()
         Vote.objects.create(user=self.other_user, post=self.post, spread=False)
-        self.post.refresh_from_db()
-        self.assertEqual(self.post.life, post_life)
+        self.assertEqual(self.post.effective_life, post_life)
+        self.other_user.stack.refresh_from_db()
         self.assertEqual(self.other_user.stack.posts.count(), stack_count - 1)
 
     def test_same_user(self):
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.utils.timezone import now
+
+from .models import Chapter, Post
+from .pools import Candidate, LocalCandidatePool
+from .tests import PublishedPostTestCase
+
+
+class LocalCandidatePoolTestCase(PublishedPostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = LocalCandidatePool()
+
+    def candidates(self) -> list[Candidate]:
+        return [c for batch in self.pool.batches(3) for c in batch]
+
+    def _publish_posts(self, count: int) -> list[Post]:
+        posts = []
+
+        for _ in range(count):
+            post = Post.objects.create(author=self.other_user)
+            Chapter.objects.create(
+                post=post, position=post.chapter_position(0), text="Text"
+            )
+            post.publish(anonymous=False)
+            posts.append(post)
+
+        return posts
+
+
+class LocalCandidatePool_batches(LocalCandidatePoolTestCase):
+    def test(self):
+        candidates = self.candidates()
+        self.assertEqual(len(candidates), 1)
+        self.assertEqual(candidates[0].id, self.post.id)
+        self.assertEqual(candidates[0].author_id, self.main_user.id)
+        self.assertEqual(candidates[0].life, self.post.life)
+
+    def test_order(self):
+        posts = [self.post] + self._publish_posts(7)
+        self.assertEqual([c.id for c in self.candidates()], [p.id for p in posts])
+
+    def test_added(self):
+        self.candidates()
+        post = self._publish_posts(1)[0]
+        self.pool.add(post)
+        self.assertEqual([c.id for c in self.candidates()], [self.post.id, post.id])
+
+    def test_expired(self):
+        self.candidates()
+        post = self._publish_posts(1)[0]
+        post.date_published = now() - settings.FYREPLACE_POST_MAX_DURATION
+        self.pool.add(post)
+        self.assertEqual([c.id for c in self.candidates()], [self.post.id])
+
+
+class LocalCandidatePool_update_life(LocalCandidatePoolTestCase):
+    def test(self):
+        self.candidates()
+        self.pool.update_life(self.post.id, -3)
+        self.assertEqual(self.candidates()[0].life, self.post.life - 3)
+
+
+class LocalCandidatePool_reserve_life(LocalCandidatePoolTestCase):
+    def test(self):
+        self.candidates()
+        self.pool.update_life(self.post.id, 1 - self.post.life)
+        self.assertTrue(self.pool.reserve_life(self.post.id))
+        self.assertFalse(self.pool.reserve_life(self.post.id))
+        self.assertEqual(self.candidates()[0].life, 0)
+
+    def test_missing(self):
+        self.candidates()
+        self.pool.discard(self.post.id)
+        self.assertIsNone(self.pool.reserve_life(self.post.id))
+
+
+class LocalCandidatePool_discard(LocalCandidatePoolTestCase):
+    def test(self):
+        posts = self._publish_posts(3)
+        self.candidates()
+        self.pool.discard(posts[1].id)
+        self.assertEqual(
+            [c.id for c in self.candidates()], [self.post.id, posts[0].id, posts[2].id]
+        )
@@ -11,12 +11,13 @@ from grpc_interceptor.exceptions import InvalidArgument, PermissionDenied
 
 from core.tests import ImageTestCaseMixin, PaginationTestCase, get_asset
 from notifications.models import Flag, Notification
+from notifications.tasks import acknowledge_comments
 from notifications.tests import BaseNotificationTestCase
 from protos import comment_pb2, id_pb2, pagination_pb2, post_pb2
 from users.models import User
 from users.tests import AuthenticatedTestCase
 
-from .models import Chapter, Comment, Post, Subscription
+from .models import Chapter, Comment, Post, Stack, Subscription, Vote
 from .services import ChapterService, CommentService, PostService
 
 
@@ -147,6 +148,40 @@ class PostService_ListFeed(PostServiceTestCase):
             for i, chapter in enumerate(next_post.chapters):
                 self.assertEqual(chapter.text, chapters[i].text)
 
+    def test_prefetch(self):
+        posts = self._create_some_posts()
+        feed = self.service.ListFeed(
+            iter(self._create_requests(posts)), self.grpc_context
+        )
+        stack = Stack.objects.get(user=self.main_user)
+        received_ids = [next(feed).id for _ in range(3 + 4)]
+        stack.refresh_from_db()
+        self.assertNotIn(posts[Stack.MAX_SIZE].id, stack.get_post_ids())
+        received_ids.append(next(feed).id)
+        stack.refresh_from_db()
+        self.assertIn(posts[Stack.MAX_SIZE].id, stack.get_post_ids())
+        date_last_filled = stack.date_last_filled
+        received_ids.append(next(feed).id)
+        stack.refresh_from_db()
+        self.assertEqual(stack.date_last_filled, date_last_filled)
+        received_ids += [post.id for post in feed]
+        self.assertEqual(received_ids, [post.id.bytes for post in posts])
+
+    def test_votes(self):
+        posts = self._create_some_posts()
+        requests = self._create_requests(posts)
+        list(self.service.ListFeed(iter(requests), self.grpc_context))
+        self.assertEqual(
+            set(
+                Vote.objects.filter(user=self.main_user).values_list(
+                    "post_id", "spread"
+                )
+            ),
+            {(p.id, r.spread) for p, r in zip(posts, requests)},
+        )
+        self.main_user.stack.refresh_from_db()
+        self.assertEqual(self.main_user.stack.posts.count(), 0)
+
     def test_anonymous(self):
         self.grpc_context.set_user(None)
         posts = self._create_some_posts(include_main_user=True)
@@ -167,6 +202,19 @@ class PostService_ListFeed(PostServiceTestCase):
         for post in Post.active_objects.all():
             self.assertEqual(post.life, 10)
 
+    def test_anonymous_shared(self):
+        self.grpc_context.set_user(None)
+        posts = self._create_some_posts(include_main_user=True)
+        next(self.service.ListFeed(iter([]), self.grpc_context))
+
+        with self.assertNumQueries(0):
+            feed = self.service.ListFeed(
+                iter(self._create_requests(posts)), self.grpc_context
+            )
+
+            for post in posts:
+                self.assertEqual(next(feed).id, post.id.bytes)
+
     def test_empty(self):
         feed = self.service.ListFeed([], self.grpc_context)
         self.assertEqual(list(feed), [])
@@ -722,7 +770,7 @@ class PostService_Report(PostServiceTestCase):
         self.assertEqual(Notification.flag_objects.count(), 1)
         flag = Notification.flag_objects.first()
         self.assertEqual(flag.target_type, ContentType.objects.get_for_model(Post))
-        self.assertEqual(flag.target_id, str(self.post.id))
+        self.assertEqual(flag.target_id, self.post.id)
 
     def test_draft(self):
         self.post.date_published = None
@@ -795,7 +843,7 @@ class ChapterService_Create(ChapterServiceTestCase):
     def test(self):
         self.service.Create(self.request, self.grpc_context)
         self.assertEqual(self.post.chapters.count(), 1)
-        self.assertEqual(self.post.chapters.first().position, "z")
+        self.assertEqual(len(self.post.chapters.first().position), 1)
 
     def test_after_chapter(self):
         first = Chapter.objects.create(
@@ -803,10 +851,11 @@ class ChapterService_Create(ChapterServiceTestCase):
         )
         self.request.position = 1
         self.service.Create(self.request, self.grpc_context)
+        position = first.position
         first.refresh_from_db()
-        self.assertEqual(first.position, "z")
+        self.assertEqual(first.position, position)
         self.assertEqual(self.post.chapters.count(), 2)
-        self.assertEqual(self.post.chapters.last().position, "zz")
+        self.assertGreater(self.post.chapters.last().position, first.position)
 
     def test_between_chapters(self):
         first = Chapter.objects.create(
@@ -817,12 +866,15 @@ class ChapterService_Create(ChapterServiceTestCase):
         )
         self.request.position = 1
         self.service.Create(self.request, self.grpc_context)
+        positions = [first.position, last.position]
         first.refresh_from_db()
         last.refresh_from_db()
-        self.assertEqual(first.position, "z")
-        self.assertEqual(last.position, "zz")
+        self.assertEqual([first.position, last.position], positions)
         self.assertEqual(self.post.chapters.count(), 3)
-        self.assertEqual(self.post.chapters.all()[1].position, "zaz")
+        self.assertEqual(
+            [chapter.id for chapter in self.post.chapters.all()[::2]],
+            [first.id, last.id],
+        )
 
     def test_invalid_position(self):
         self.request.position = 4
@@ -1334,6 +1386,28 @@ class CommentService_Acknowledge(CommentServiceTestCase):
         notification = Notification.objects.get(subscription=subscription)
         self.assertEqual(notification.count, 4)
 
+    def test_debounced(self):
+        subscriptions = Subscription.objects.filter(user=self.main_user, post=self.post)
+        subscriptions.update(date_acknowledgement_scheduled=now())
+        self.service.Acknowledge(self.request, self.grpc_context)
+        subscription = subscriptions.get()
+        self.assertEqual(subscription.last_comment_seen, self.comment)
+        notification = Notification.objects.get(subscription=subscription)
+        self.assertEqual(notification.count, 10)
+        acknowledge_comments(str(self.post.id), str(self.main_user.id))
+        notification.refresh_from_db()
+        self.assertEqual(notification.count, 4)
+        self.assertIsNone(subscriptions.get().date_acknowledgement_scheduled)
+
+    def test_debounce_expired(self):
+        debounce = settings.FYREPLACE_ACKNOWLEDGEMENT_DEBOUNCE
+        Subscription.objects.filter(user=self.main_user, post=self.post).update(
+            date_acknowledgement_scheduled=now() - 3 * debounce
+        )
+        self.service.Acknowledge(self.request, self.grpc_context)
+        notification = Notification.objects.get(subscription__user=self.main_user)
+        self.assertEqual(notification.count, 4)
+
 
 class CommentService_Report(CommentServiceTestCase):
     def setUp(self):
@@ -1347,7 +1421,7 @@ class CommentService_Report(CommentServiceTestCase):
         self.assertEqual(Notification.flag_objects.count(), 1)
         flag = Notification.flag_objects.first()
         self.assertEqual(flag.target_type, ContentType.objects.get_for_model(Comment))
-        self.assertEqual(flag.target_id, str(self.comment.id))
+        self.assertEqual(flag.target_id, self.comment.id)
 
     def test_self_author(self):
         comments = self._create_comments(author=self.main_user, count=1)
@@ -1,9 +1,20 @@
 from datetime import timedelta
 
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.timezone import now
 
-from .models import Stack
-from .tasks import cleanup_stacks
+from core.purge import purge_key, purge_progress
+
+from .models import Chapter, Comment, LifeDelta, Post, Stack
+from .pools import get_candidate_pool
+from .tasks import (
+    cleanup_expired_posts,
+    cleanup_stacks,
+    flush_post_life,
+    remove_post_data,
+    remove_post_data_for_user,
+)
 from .tests import PublishedPostTestCase
 
 
@@ -19,9 +30,151 @@ class Task_cleanup_stacks(PublishedPostTestCase):
             date_last_filled=now() - timedelta(days=1)
         )
         cleanup_stacks.delay()
+        self.stack.refresh_from_db()
         self.assertEqual(self.stack.posts.count(), 0)
 
     def test_to_soon(self):
         self.assertEqual(self.stack.posts.count(), 1)
         cleanup_stacks.delay()
+        self.stack.refresh_from_db()
         self.assertEqual(self.stack.posts.count(), 1)
+
+    def test_life(self):
+        post_life = self.post.effective_life
+        Stack.objects.update(date_last_filled=now() - timedelta(days=1))
+        cleanup_stacks.delay()
+        self.assertEqual(self.post.effective_life, post_life + 1)
+        self.assertTrue(LifeDelta.objects.filter(post_id=self.post.id).exists())
+        self.assertEqual(
+            [
+                c.life
+                for batch in get_candidate_pool().batches(Stack.MAX_SIZE)
+                for c in batch
+                if c.id == self.post.id
+            ],
+            [post_life + 1],
+        )
+
+    def test_checkpoint(self):
+        post = Post.objects.create(author=self.other_user)
+        Chapter.objects.create(
+            post=post, position=post.chapter_position(0), text="Text"
+        )
+        post.publish(anonymous=False)
+        main_stack = Stack.objects.get(user=self.main_user)
+        main_stack.fill()
+        Stack.objects.update(date_last_filled=now() - timedelta(days=1))
+        first_stack, last_stack = sorted([self.stack, main_stack], key=lambda s: s.id)
+        cache.set(
+            purge_key("posts:cleanup_stacks"), {"last_pk": first_stack.id, "count": 0}
+        )
+        cleanup_stacks.delay()
+        first_stack.refresh_from_db()
+        last_stack.refresh_from_db()
+        self.assertEqual(first_stack.posts.count(), 1)
+        self.assertEqual(last_stack.posts.count(), 0)
+        cleanup_stacks.delay()
+        first_stack.refresh_from_db()
+        self.assertEqual(first_stack.posts.count(), 0)
+
+
+class Task_flush_post_life(PublishedPostTestCase):
+    def test(self):
+        post_life = self.post.life
+
+        for amount in (-1, -1, 3):
+            LifeDelta.record(self.post.id, amount)
+
+        flush_post_life.delay()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, post_life + 1)
+        self.assertEqual(self.post.effective_life, post_life + 1)
+        self.assertFalse(LifeDelta.objects.exists())
+
+    def test_chunks(self):
+        posts = [self.post] + [
+            Post.objects.create(author=self.main_user, life=10) for _ in range(2)
+        ]
+
+        for post in posts:
+            LifeDelta.record(post.id, 1)
+
+        flush_post_life.delay(chunk_size=1)
+        self.assertFalse(LifeDelta.objects.exists())
+
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(post.life, 11)
+
+    def test_negative(self):
+        LifeDelta.record(self.post.id, -self.post.life - 5)
+        flush_post_life.delay()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, 0)
+        self.assertFalse(Post.active_objects.filter(id=self.post.id).exists())
+
+
+class Task_cleanup_expired_posts(PublishedPostTestCase):
+    def test(self):
+        Post.objects.filter(id=self.post.id).update(
+            date_published=now() - settings.FYREPLACE_POST_MAX_DURATION
+        )
+        LifeDelta.record(self.post.id, 1)
+        cleanup_expired_posts.delay()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, 0)
+        self.assertFalse(LifeDelta.objects.exists())
+
+    def test_active(self):
+        cleanup_expired_posts.delay()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, 10)
+
+
+class Task_remove_post_data_for_user(PublishedPostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.post] + [
+            Post.objects.create(author=self.main_user) for _ in range(2)
+        ]
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.main_user, text="Text"
+        )
+
+    def test(self):
+        remove_post_data_for_user.delay(user_id=str(self.main_user.id))
+        self.assertFalse(Post.existing_objects.filter(author=self.main_user).exists())
+        self.assertFalse(Chapter.objects.filter(post=self.post).exists())
+        self.assertFalse(Comment.objects.filter(id=self.comment.id).exists())
+        self.assertIsNone(purge_progress(f"posts:{self.main_user.id}:posts"))
+
+    def test_resume(self):
+        first_post, *other_posts = sorted(self.posts, key=lambda p: p.id)
+        cache.set(
+            purge_key(f"posts:{self.main_user.id}:posts"),
+            {"last_pk": first_post.id, "count": 1},
+        )
+        remove_post_data_for_user.delay(user_id=str(self.main_user.id))
+        self.assertEqual(
+            list(Post.existing_objects.filter(author=self.main_user)), [first_post]
+        )
+
+        for post in other_posts:
+            post.refresh_from_db()
+            self.assertTrue(post.is_deleted)
+
+
+class Task_remove_post_data(PublishedPostTestCase):
+    def setUp(self):
+        super().setUp()
+        Comment.objects.create(post=self.post, author=self.other_user, text="Text")
+
+    def test(self):
+        remove_post_data.delay(post_ids=[str(self.post.id)])
+        self.assertFalse(Chapter.objects.filter(post=self.post).exists())
+        self.assertFalse(Comment.objects.filter(post=self.post).exists())
+
+    def test_single_post_id(self):
+        remove_post_data.delay(post_id=str(self.post.id))
+        self.assertFalse(Chapter.objects.filter(post=self.post).exists())
+        self.assertFalse(Comment.objects.filter(post=self.post).exists())
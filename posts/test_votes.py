@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.cache import cache
+from grpc_interceptor.exceptions import PermissionDenied
+
+from .models import Vote
+from .tests import PublishedPostTestCase
+from .votes import VoteBuffer
+
+
+class VoteBuffer_add(PublishedPostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buffer = VoteBuffer(self.other_user.id)
+        self.other_user.stack.fill()
+
+    def test(self):
+        post_life = self.post.effective_life
+        self.buffer.add(self.post.id, spread=True)
+        self.assertFalse(Vote.objects.exists())
+        self.buffer.flush()
+        self.assertTrue(
+            Vote.objects.filter(user=self.other_user, post=self.post).exists()
+        )
+        self.assertEqual(
+            self.post.effective_life, post_life + settings.FYREPLACE_POST_SPREAD_LIFE
+        )
+        self.other_user.stack.refresh_from_db()
+        self.assertEqual(self.other_user.stack.posts.count(), 0)
+
+    def test_twice(self):
+        self.buffer.add(self.post.id, spread=False)
+
+        with self.assertRaises(PermissionDenied):
+            VoteBuffer(self.other_user.id).add(self.post.id, spread=False)
+
+    def test_already_voted(self):
+        Vote.objects.create(user=self.other_user, post=self.post, spread=False)
+
+        with self.assertRaises(PermissionDenied):
+            self.buffer.add(self.post.id, spread=False)
+
+    def test_evicted(self):
+        self.buffer.add(self.post.id, spread=False)
+        self.buffer.flush()
+        cache.clear()
+
+        with self.assertRaises(PermissionDenied):
+            VoteBuffer(self.other_user.id).add(self.post.id, spread=False)
+
+    def test_warm(self):
+        self.buffer.index.warm()
+
+        with self.assertNumQueries(0):
+            self.buffer.add(self.post.id, spread=False)
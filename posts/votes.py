@@ -0,0 +1,68 @@
+from typing import Any
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import now
+from grpc_interceptor.exceptions import PermissionDenied
+
+from .models import Vote
+from .tasks import apply_votes
+
+
+class VotedIndex:
+    def __init__(self, user_id: Any):
+        self.key = f"{settings.APP_NAME}:votes:{user_id}"
+        self.user_id = user_id
+
+    @property
+    def timeout(self) -> float:
+        return settings.FYREPLACE_POST_MAX_DURATION.total_seconds()
+
+    def claim(self, post_id: UUID) -> bool:
+        self.warm()
+        return cache.add(f"{self.key}:{post_id}", True, self.timeout)
+
+    def warm(self):
+        if cache.get(self.key):
+            return
+
+        deadline = now() - settings.FYREPLACE_POST_MAX_DURATION
+        cache.set_many(
+            {
+                f"{self.key}:{post_id}": True
+                for post_id in Vote.objects.filter(
+                    user_id=self.user_id, post__date_published__gte=deadline
+                ).values_list("post_id", flat=True)
+            },
+            self.timeout,
+        )
+        cache.set(self.key, True, self.timeout)
+
+
+class VoteBuffer:
+    def __init__(self, user_id: Any):
+        self.index = VotedIndex(user_id)
+        self.user_id = user_id
+        self.pending: dict[UUID, bool] = {}
+        self.voted_ids: set[UUID] = set()
+
+    def add(self, post_id: UUID, spread: bool):
+        if post_id in self.voted_ids or not self.index.claim(post_id):
+            raise PermissionDenied("post_already_voted")
+
+        self.pending[post_id] = spread
+        self.voted_ids.add(post_id)
+
+        if len(self.pending) >= settings.FYREPLACE_VOTE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        apply_votes.delay(
+            user_id=str(self.user_id),
+            votes={str(post_id): spread for post_id, spread in self.pending.items()},
+        )
+        self.pending = {}
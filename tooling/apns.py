@@ -0,0 +1,156 @@
+import asyncio
+from http.client import GONE, OK, SERVICE_UNAVAILABLE
+from threading import Event, Thread
+from typing import Iterable, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+from h2.events import (
+    ConnectionTerminated,
+    DataReceived,
+    RequestReceived,
+    StreamEnded,
+    StreamReset,
+)
+from h2.exceptions import ProtocolError, StreamClosedError
+from h2.settings import SettingCodes
+
+
+class ApnsProtocol(asyncio.Protocol):
+    def __init__(self, server: "ApnsServer"):
+        self.server = server
+        self.connection = H2Connection(
+            H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        self.paths = {}
+        self.transport: Optional[asyncio.Transport] = None
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        self.connection.initiate_connection()
+        self.connection.update_settings(
+            {SettingCodes.MAX_CONCURRENT_STREAMS: self.server.max_streams}
+        )
+        self.flush()
+
+    def data_received(self, data: bytes):
+        try:
+            events = self.connection.receive_data(data)
+        except ProtocolError:
+            self.flush()
+            self.transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, RequestReceived):
+                self.paths[event.stream_id] = dict(event.headers)[":path"]
+            elif isinstance(event, DataReceived):
+                self.connection.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id
+                )
+            elif isinstance(event, StreamEnded):
+                asyncio.get_running_loop().call_later(
+                    self.server.latency, self.respond, event.stream_id
+                )
+            elif isinstance(event, StreamReset):
+                self.paths.pop(event.stream_id, None)
+            elif isinstance(event, ConnectionTerminated):
+                self.transport.close()
+
+        self.flush()
+
+    def respond(self, stream_id: int):
+        if self.transport.is_closing() or stream_id not in self.paths:
+            return
+
+        token = self.paths.pop(stream_id).rsplit("/", 1)[-1]
+        self.server.request_count += 1
+
+        if token in self.server.unavailable_tokens:
+            self.server.unavailable_tokens.discard(token)
+            status, body = SERVICE_UNAVAILABLE, b'{"reason":"ServiceUnavailable"}'
+        elif token in self.server.gone_tokens:
+            status, body = GONE, b'{"reason":"Unregistered"}'
+        else:
+            status, body = OK, b""
+
+        try:
+            self.connection.send_headers(
+                stream_id,
+                [
+                    (":status", str(status)),
+                    ("content-length", str(len(body))),
+                ],
+                end_stream=not body,
+            )
+
+            if body:
+                self.connection.send_data(stream_id, body, end_stream=True)
+        except StreamClosedError:
+            return
+
+        self.flush()
+
+    def flush(self):
+        self.transport.write(self.connection.data_to_send())
+
+
+class ApnsServer:
+    def __init__(
+        self,
+        gone_tokens: Iterable[str] = (),
+        latency: float = 0.0,
+        max_streams: int = 1000,
+        unavailable_tokens: Iterable[str] = (),
+    ):
+        self.gone_tokens = set(gone_tokens)
+        self.unavailable_tokens = set(unavailable_tokens)
+        self.latency = latency
+        self.max_streams = max_streams
+        self.request_count = 0
+        self.port: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "ApnsServer":
+        self._thread = Thread(target=self._serve)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *args):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        server = self._loop.run_until_complete(
+            self._loop.create_server(lambda: ApnsProtocol(self), "127.0.0.1", 0)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+
+        try:
+            self._loop.run_forever()
+        finally:
+            server.close()
+            self._loop.close()
+
+
+def make_private_key() -> str:
+    return (
+        ec.generate_private_key(ec.SECP256R1())
+        .private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        .decode("ascii")
+    )
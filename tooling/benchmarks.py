@@ -0,0 +1,102 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from statistics import mean, median
+from threading import Event, Thread
+from time import perf_counter
+from typing import Any, Callable, Iterable, Optional
+
+from celery import current_app
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+
+class LockWaitSampler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = []
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def supported(self) -> bool:
+        return connection.vendor == "postgresql"
+
+    @property
+    def peak(self) -> Optional[int]:
+        return max(self.samples, default=0) if self.supported else None
+
+    @property
+    def average(self) -> Optional[float]:
+        return mean(self.samples) if self.supported and self.samples else None
+
+    def __enter__(self) -> "LockWaitSampler":
+        if self.supported:
+            self._thread = Thread(target=self._sample)
+            self._thread.start()
+
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+
+        if self._thread:
+            self._thread.join()
+
+    def _sample(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self._stop.wait(self.interval):
+                    cursor.execute("SELECT count(*) FROM pg_locks WHERE NOT granted")
+                    self.samples.append(cursor.fetchone()[0])
+        finally:
+            connection.close()
+
+
+class BenchmarkCommand(BaseCommand, ABC):
+    def handle(self, *args, **options):
+        current_app.conf.task_always_eager = True
+        old_config = setup_databases(verbosity=0, interactive=False)
+
+        try:
+            self.benchmark(**options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    @abstractmethod
+    def benchmark(self, **options):
+        raise NotImplementedError
+
+    def measure(self, action: Callable[[], Any]) -> float:
+        start = perf_counter()
+        action()
+        return perf_counter() - start
+
+    def measure_concurrently(
+        self, actions: Iterable[Callable[[], Any]], workers: int
+    ) -> list[float]:
+        start = Event()
+
+        def run(action: Callable[[], Any]) -> float:
+            start.wait()
+
+            try:
+                return self.measure(action)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run, action) for action in actions]
+            start.set()
+            return [future.result() for future in futures]
+
+    def report(self, label: str, durations: list[float], total: float, **extra):
+        details = [
+            f"{len(durations)} ops in {total:.3f}s",
+            f"{len(durations) / total:.1f} ops/s",
+            f"mean {mean(durations) * 1000:.2f}ms",
+            f"median {median(durations) * 1000:.2f}ms",
+            f"max {max(durations) * 1000:.2f}ms",
+        ]
+        details += [f"{key.replace('_', ' ')} {value}" for key, value in extra.items()]
+        self.stdout.write(f"{label}: " + ", ".join(details))
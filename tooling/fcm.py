@@ -0,0 +1,63 @@
+from threading import Lock
+from time import sleep
+from typing import Iterable
+
+from firebase_admin import exceptions, messaging
+
+
+class FakeMessaging:
+    def __init__(
+        self,
+        unregistered_tokens: Iterable[str] = (),
+        latency: float = 0.0,
+        invalid_tokens: Iterable[str] = (),
+        unavailable_tokens: Iterable[str] = (),
+    ):
+        self.unregistered_tokens = set(unregistered_tokens)
+        self.invalid_tokens = set(invalid_tokens)
+        self.unavailable_tokens = set(unavailable_tokens)
+        self.latency = latency
+        self.batch_count = 0
+        self.token_count = 0
+        self._lock = Lock()
+        self._send = None
+
+    def __enter__(self) -> "FakeMessaging":
+        self._send = messaging.send_each_for_multicast
+        messaging.send_each_for_multicast = self.send_each_for_multicast
+        return self
+
+    def __exit__(self, *args):
+        messaging.send_each_for_multicast = self._send
+
+    def send_each_for_multicast(
+        self, message: messaging.MulticastMessage, *args, **kwargs
+    ) -> messaging.BatchResponse:
+        sleep(self.latency)
+
+        with self._lock:
+            self.batch_count += 1
+            self.token_count += len(message.tokens)
+            unavailable_tokens = self.unavailable_tokens.intersection(message.tokens)
+            self.unavailable_tokens -= unavailable_tokens
+
+        if unavailable_tokens:
+            raise exceptions.UnavailableError("Service unavailable.")
+
+        return messaging.BatchResponse(
+            [
+                messaging.SendResponse(
+                    None,
+                    (
+                        messaging.UnregisteredError("Requested entity was not found.")
+                        if token in self.unregistered_tokens
+                        else (
+                            exceptions.InvalidArgumentError("Invalid token.")
+                            if token in self.invalid_tokens
+                            else None
+                        )
+                    ),
+                )
+                for token in message.tokens
+            ]
+        )
@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+
+from notifications.models import MessagingService, RemoteMessaging
+from notifications.remote import apns
+from tooling.apns import ApnsServer, make_private_key
+from tooling.benchmarks import BenchmarkCommand
+from users.models import Connection
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Sends APNs notifications to a local HTTP/2 stand-in server "
+        "and reports throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tokens", type=int, nargs="+", default=[100, 1000, 5000])
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+        parser.add_argument("--latency", type=float, default=0.02)
+        parser.add_argument("--gone-every", type=int, default=100)
+
+    def benchmark(
+        self,
+        tokens: list[int],
+        concurrency: list[int],
+        latency: float,
+        gone_every: int,
+        **options,
+    ):
+        User = get_user_model()
+        gone_tokens = [
+            f"token{count}-{i}" for count in tokens for i in range(0, count, gone_every)
+        ]
+
+        with ApnsServer(gone_tokens, latency) as server, override_settings(
+            APNS_URL=server.url, APNS_PRIVATE_KEY=make_private_key()
+        ):
+            for count in tokens:
+                users = User.objects.bulk_create(
+                    User(
+                        username=f"reader{count}-{i}", email=f"{count}-{i}@example.com"
+                    )
+                    for i in range(count)
+                )
+                connections = Connection.objects.bulk_create(
+                    Connection(user=user) for user in users
+                )
+
+                for limit in concurrency:
+                    RemoteMessaging.objects.filter(connection__in=connections).delete()
+                    RemoteMessaging.objects.bulk_create(
+                        RemoteMessaging(
+                            connection=connection,
+                            service=MessagingService.APNS,
+                            token=f"token{count}-{i}",
+                        )
+                        for i, connection in enumerate(connections)
+                    )
+                    duration = self.measure(
+                        lambda: apns.send_message(
+                            None, users, "notifications:clear", concurrency=limit
+                        )
+                    )
+                    remaining = RemoteMessaging.objects.filter(
+                        connection__in=connections
+                    ).count()
+                    self.report(
+                        f"{count} tokens, {limit} streams",
+                        [duration / count] * count,
+                        duration,
+                        deleted=count - remaining,
+                    )
@@ -0,0 +1,57 @@
+from random import randrange
+
+from django.contrib.auth import get_user_model
+from django.db.models.functions import Length
+
+from core.tests import FakeContext
+from posts.models import Chapter, Post
+from posts.services import ChapterService
+from protos import post_pb2
+from tooling.benchmarks import BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Runs random ChapterService.Move calls and reports throughput and key lengths."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--moves", type=int, default=10_000)
+
+    def benchmark(self, moves: int, **options):
+        author = get_user_model().objects.create_user(username="author")
+        post = Post.objects.create(author=author)
+
+        for i in range(Post.MAX_CHAPTERS):
+            Chapter.objects.create(
+                post=post, position=post.chapter_position(i), text=f"Text {i}"
+            )
+
+        service = ChapterService()
+        context = FakeContext()
+        context.caller = author
+        durations = []
+        lengths = []
+
+        for _ in range(moves):
+            request = post_pb2.ChapterRelocation(
+                post_id=post.id.bytes,
+                from_position=randrange(Post.MAX_CHAPTERS),
+                to_position=randrange(Post.MAX_CHAPTERS),
+            )
+            durations.append(self.measure(lambda: service.Move(request, context)))
+            lengths.append(
+                max(
+                    post.chapters.annotate(length=Length("position")).values_list(
+                        "length", flat=True
+                    )
+                )
+            )
+
+        self.report(
+            "random moves",
+            durations,
+            sum(durations),
+            max_key_length=max(lengths),
+            average_key_length=f"{sum(lengths) / len(lengths):.1f}",
+        )
@@ -0,0 +1,82 @@
+from datetime import timedelta
+from random import sample
+
+from django.contrib.auth import get_user_model
+from django.db.transaction import atomic
+from django.utils.timezone import now
+
+from posts.models import Post, Stack
+from posts.tasks import cleanup_stacks
+from tooling.benchmarks import BenchmarkCommand, LockWaitSampler
+
+
+def cleanup_stacks_one_by_one():
+    deadline = now() - timedelta(days=1)
+
+    while (
+        stack_ids := Stack.objects.filter(date_last_filled__lte=deadline)
+        .exclude(post_ids=b"")
+        .values("id")
+    ):
+        stacks = Stack.objects.select_for_update().filter(id__in=stack_ids)
+
+        with atomic():
+            for stack in stacks[:100]:
+                stack.drain()
+
+
+class Command(BenchmarkCommand):
+    help = "Drains stale stacks one by one and in bulk, and reports duration and lock waits."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stacks", type=int, default=100_000)
+        parser.add_argument("--posts", type=int, default=500)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def benchmark(self, stacks: int, posts: int, chunk_size: int, **options):
+        User = get_user_model()
+        author = User.objects.create_user(username="author")
+        post_ids = [
+            post.id
+            for post in Post.objects.bulk_create(
+                Post(author=author, date_published=now(), life=10) for _ in range(posts)
+            )
+        ]
+        users = User.objects.bulk_create(
+            (
+                User(username=f"reader{i}", email=f"reader{i}@example.com")
+                for i in range(stacks)
+            ),
+            batch_size=chunk_size,
+        )
+        Stack.objects.bulk_create(
+            (Stack(user=user) for user in users), batch_size=chunk_size
+        )
+
+        for label, cleanup in (
+            ("one by one", cleanup_stacks_one_by_one),
+            ("bulk", lambda: cleanup_stacks(chunk_size=chunk_size)),
+        ):
+            self.stale_stacks(post_ids)
+
+            with LockWaitSampler() as sampler:
+                duration = self.measure(cleanup)
+
+            self.report(
+                label,
+                [duration],
+                duration,
+                stacks_per_second=f"{stacks / duration:.0f}",
+                peak_lock_waits=sampler.peak,
+                average_lock_waits=sampler.average,
+            )
+
+    def stale_stacks(self, post_ids):
+        date_last_filled = now() - timedelta(days=1)
+        stacks = list(Stack.objects.only("id"))
+
+        for stack in stacks:
+            stack.set_post_ids(sample(post_ids, Stack.MAX_SIZE))
+
+        Stack.objects.bulk_update(stacks, ["post_ids"], batch_size=1000)
+        Stack.objects.update(date_last_filled=date_last_filled)
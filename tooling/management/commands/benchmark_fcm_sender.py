@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.utils.timezone import now
+
+from notifications.models import MessagingService, RemoteMessaging
+from notifications.remote import fcm
+from posts.models import Comment, Post
+from tooling.benchmarks import BenchmarkCommand
+from tooling.fcm import FakeMessaging
+from users.models import Connection
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Sends FCM multicast batches to a local fake of firebase messaging "
+        "and reports throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tokens", type=int, nargs="+", default=[1000, 5000])
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+        parser.add_argument("--latency", type=float, default=0.1)
+        parser.add_argument("--unregistered-every", type=int, default=100)
+
+    def benchmark(
+        self,
+        tokens: list[int],
+        workers: list[int],
+        latency: float,
+        unregistered_every: int,
+        **options,
+    ):
+        User = get_user_model()
+        author = User.objects.create_user(username="author")
+        post = Post.objects.create(author=author, date_published=now())
+        [comment] = Comment.objects.bulk_create(
+            [Comment(post=post, author=author, text="Text")]
+        )
+        unregistered_tokens = [
+            f"token{count}-{i}"
+            for count in tokens
+            for i in range(0, count, unregistered_every)
+        ]
+
+        with FakeMessaging(unregistered_tokens, latency) as fake, override_settings(
+            FIREBASE_APP=True
+        ):
+            for count in tokens:
+                users = User.objects.bulk_create(
+                    User(
+                        username=f"reader{count}-{i}", email=f"{count}-{i}@example.com"
+                    )
+                    for i in range(count)
+                )
+                connections = Connection.objects.bulk_create(
+                    Connection(user=user) for user in users
+                )
+                users = User.objects.filter(username__startswith=f"reader{count}-")
+
+                for limit in workers:
+                    RemoteMessaging.objects.filter(connection__in=connections).delete()
+                    RemoteMessaging.objects.bulk_create(
+                        RemoteMessaging(
+                            connection=connection,
+                            service=MessagingService.FCM,
+                            token=f"token{count}-{i}",
+                        )
+                        for i, connection in enumerate(connections)
+                    )
+                    batch_count = fake.batch_count
+                    duration = self.measure(
+                        lambda: fcm.send_comment_change(comment, users, workers=limit)
+                    )
+                    remaining = RemoteMessaging.objects.filter(
+                        connection__in=connections
+                    ).count()
+                    self.report(
+                        f"{count} tokens, {limit} workers",
+                        [duration / count] * count,
+                        duration,
+                        batches=fake.batch_count - batch_count,
+                        deleted=count - remaining,
+                    )
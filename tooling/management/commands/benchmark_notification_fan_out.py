@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db.transaction import atomic
+from django.utils.timezone import now
+
+from notifications.models import Notification
+from notifications.tasks import send_notifications
+from posts.models import Comment, Post, Subscription
+from tooling.benchmarks import BenchmarkCommand
+
+
+def send_notifications_one_by_one(comment_id: str, new_notifications: bool):
+    comment = Comment.objects.get(id=comment_id)
+    subscriptions = Subscription.objects.filter(post_id=comment.post_id).exclude(
+        user_id=comment.author_id
+    )
+
+    for subscription_id in subscriptions.values_list("id", flat=True):
+        with atomic():
+            notification, created = Notification.objects.get_or_create(
+                subscription_id=subscription_id,
+                target_type=ContentType.objects.get_for_model(Post),
+                target_id=comment.post_id,
+            )
+
+            if not created:
+                notification.save()
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Fans out comment notifications one by one and in bulk, and reports durations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--subscribers", type=int, nargs="+", default=[1000, 10_000, 100_000]
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def benchmark(self, subscribers: list[int], chunk_size: int, **options):
+        User = get_user_model()
+        author = User.objects.create_user(username="author")
+
+        for count in subscribers:
+            post = Post.objects.create(author=author, date_published=now())
+            users = User.objects.bulk_create(
+                (
+                    User(
+                        username=f"reader{count}-{i}", email=f"{count}-{i}@example.com"
+                    )
+                    for i in range(count)
+                ),
+                batch_size=chunk_size,
+            )
+            Subscription.objects.bulk_create(
+                (Subscription(user=user, post=post) for user in users),
+                batch_size=chunk_size,
+            )
+            [comment] = Comment.objects.bulk_create(
+                [Comment(post=post, author=author, text="Text")]
+            )
+
+            for label, fan_out in (
+                ("one by one", send_notifications_one_by_one),
+                (
+                    "bulk",
+                    lambda comment_id, new_notifications: send_notifications(
+                        comment_id, new_notifications, chunk_size=chunk_size
+                    ),
+                ),
+            ):
+                Notification.objects.filter(target_id=post.id).delete()
+                durations = [
+                    self.measure(lambda: fan_out(str(comment.id), True))
+                    for _ in range(2)
+                ]
+                self.report(
+                    f"{label} ({count} subscribers)",
+                    durations,
+                    sum(durations),
+                    first_fan_out=f"{durations[0]:.3f}s",
+                    repeated_fan_out=f"{durations[1]:.3f}s",
+                )
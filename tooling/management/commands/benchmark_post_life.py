@@ -0,0 +1,67 @@
+from time import perf_counter, sleep
+
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.db.transaction import atomic
+from django.utils.timezone import now
+
+from posts.models import LifeDelta, Post
+from posts.tasks import flush_post_life
+from tooling.benchmarks import BenchmarkCommand, LockWaitSampler
+
+
+def update_row(post_id, amount: int):
+    Post.objects.filter(id=post_id).update(life=models.F("life") + amount)
+
+
+class Command(BenchmarkCommand):
+    help = "Runs concurrent life changes on a single hot post and reports throughput and lock waits."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--changes", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument(
+            "--hold",
+            type=float,
+            default=5,
+            help="Milliseconds each transaction stays open after changing life.",
+        )
+
+    def benchmark(self, changes: int, workers: int, hold: float, **options):
+        author = get_user_model().objects.create_user(username="author")
+        post = Post.objects.create(
+            author=author, date_published=now(), life=2 * changes
+        )
+
+        for label, change in (
+            ("single row", update_row),
+            ("sharded deltas", LifeDelta.record),
+        ):
+            self.run_changes(label, change, post.id, changes, workers, hold / 1000)
+
+        flush_duration = self.measure(flush_post_life)
+        post.refresh_from_db()
+        self.stdout.write(
+            f"flush: {flush_duration * 1000:.2f}ms, final life {post.life}"
+        )
+
+    def run_changes(self, label, change, post_id, changes, workers, hold):
+        def action():
+            with atomic():
+                change(post_id, -1)
+                sleep(hold)
+
+        start = perf_counter()
+
+        with LockWaitSampler() as sampler:
+            durations = self.measure_concurrently(
+                (action for _ in range(changes)), workers
+            )
+
+        self.report(
+            label,
+            durations,
+            perf_counter() - start,
+            peak_lock_waits=sampler.peak,
+            average_lock_waits=sampler.average,
+        )
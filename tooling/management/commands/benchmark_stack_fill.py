@@ -0,0 +1,87 @@
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.db.transaction import atomic
+from django.utils.timezone import now
+
+from posts.models import Post, Stack
+from tooling.benchmarks import BenchmarkCommand, LockWaitSampler
+
+
+def fill_with_locks(stack: Stack):
+    current_post_ids = stack.get_post_ids()
+
+    if len(current_post_ids) >= Stack.MAX_SIZE:
+        return
+
+    post_ids = list(
+        Post.active_objects.select_for_update()
+        .exclude(author=stack.user)
+        .exclude(author__in=stack.user.blocked_users.values("id"))
+        .exclude(author__in=stack.user.blocking_users.values("id"))
+        .exclude(voters=stack.user)
+        .order_by("date_published")
+        .values_list("id", flat=True)[: Stack.MAX_SIZE]
+    )
+    stack.set_post_ids(post_ids)
+    Post.objects.filter(id__in=post_ids).exclude(id__in=current_post_ids).update(
+        life=models.F("life") - 1
+    )
+    stack.save()
+
+
+class Command(BenchmarkCommand):
+    help = "Runs concurrent stack refills, like ListFeed does, and reports throughput and lock waits."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=32)
+        parser.add_argument("--posts", type=int, default=50)
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--workers", type=int, default=16)
+
+    def benchmark(self, users: int, posts: int, rounds: int, workers: int, **options):
+        author = get_user_model().objects.create_user(username="author")
+        readers = [
+            get_user_model().objects.create_user(username=f"reader{i}")
+            for i in range(users)
+        ]
+        stack_ids = list(
+            Stack.objects.filter(user__in=readers).values_list("id", flat=True)
+        )
+        Post.objects.bulk_create(
+            Post(author=author, date_published=now(), life=2 * users * rounds)
+            for _ in range(posts)
+        )
+
+        for label, fill in (
+            ("select_for_update", fill_with_locks),
+            ("conditional updates", Stack.fill),
+        ):
+            self.run_refills(label, fill, stack_ids, rounds, workers)
+
+    def run_refills(self, label, fill, stack_ids, rounds, workers):
+        def refill(stack_id):
+            def action():
+                with atomic():
+                    fill(Stack.objects.select_for_update().get(id=stack_id))
+
+            return action
+
+        durations = []
+        start = perf_counter()
+
+        with LockWaitSampler() as sampler:
+            for _ in range(rounds):
+                Stack.objects.update(post_ids=b"")
+                durations += self.measure_concurrently(
+                    (refill(stack_id) for stack_id in stack_ids), workers
+                )
+
+        self.report(
+            label,
+            durations,
+            perf_counter() - start,
+            peak_lock_waits=sampler.peak,
+            average_lock_waits=sampler.average,
+        )
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0007_alter_user_bio"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["username", "date_joined", "id"],
+                name="users_user_existing_idx",
+            ),
+        ),
+    ]
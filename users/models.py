@@ -1,5 +1,5 @@
 from datetime import timedelta
-from typing import Optional
+from typing import Any, Optional
 
 from django.conf import settings
 from django.contrib.auth.hashers import (
@@ -49,6 +49,13 @@ class ExistingUserManager(UserManager):
 class User(AbstractUser, UUIDModel, SoftDeleteModel):
     class Meta:
         ordering = ["username", "date_joined", "id"]
+        indexes = [
+            models.Index(
+                fields=["username", "date_joined", "id"],
+                condition=models.Q(is_deleted=False),
+                name="users_user_existing_idx",
+            )
+        ]
 
     existing_objects = ExistingUserManager()
     default_message_class = user_pb2.User
@@ -138,9 +145,7 @@ class User(AbstractUser, UUIDModel, SoftDeleteModel):
 
     def get_message_field_values(self, **overrides) -> dict:
         if self._context and self._context.caller:
-            overrides["is_blocked"] = self._context.caller.blocked_users.filter(
-                id=self.id
-            ).exists()
+            overrides["is_blocked"] = self._context.caller.is_blocking(self.id)
 
         values = super().get_message_field_values(**overrides)
 
@@ -154,6 +159,15 @@ class User(AbstractUser, UUIDModel, SoftDeleteModel):
 
         return values
 
+    def is_blocking(self, user_id: Any) -> bool:
+        if hasattr(self, "blocked_user_ids"):
+            return user_id in self.blocked_user_ids
+
+        return self.blocked_users.filter(id=user_id).exists()
+
+    def prefetch_blocked_users(self):
+        self.blocked_user_ids = set(self.blocked_users.values_list("id", flat=True))
+
     def delete(self, *args, **kwargs) -> tuple[int, dict[str, int]]:
         return self.soft_delete()
 
@@ -342,7 +342,7 @@ class UserService(PaginatorMixin, ImageUploadMixin, user_pb2_grpc.UserServiceSer
         Flag.objects.get_or_create(
             issuer=context.caller,
             target_type=ContentType.objects.get_for_model(get_user_model()),
-            target_id=str(user.id),
+            target_id=user.id,
         )
         return empty_pb2.Empty()
 
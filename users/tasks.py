@@ -11,6 +11,8 @@ from django.db.transaction import atomic
 from django.utils.timezone import now
 from httpx import get
 
+from core.purge import purge_delete
+
 from .emails import (
     AccountActivationEmail,
     AccountConnectionEmail,
@@ -23,15 +25,20 @@ from .models import Connection
 @shared_task
 def cleanup_users():
     deadline = now() - settings.FYREPLACE_INACTIVE_USER_DURATION
-    get_user_model().objects.filter(
-        date_joined__lte=deadline, is_active=False, is_deleted=False
-    ).delete()
+    purge_delete(
+        "users:inactive",
+        get_user_model().objects.filter(
+            date_joined__lte=deadline, is_active=False, is_deleted=False
+        ),
+    )
 
 
 @shared_task
 def cleanup_connections():
     deadline = now() - settings.FYREPLACE_CONNECTION_DURATION
-    Connection.objects.filter(date_last_used__lte=deadline).delete()
+    purge_delete(
+        "connections:unused", Connection.objects.filter(date_last_used__lte=deadline)
+    )
 
 
 @shared_task
@@ -759,7 +759,7 @@ class UserService_Report(UserServiceTestCase):
         self.assertEqual(
             flag.target_type, ContentType.objects.get_for_model(get_user_model())
         )
-        self.assertEqual(flag.target_id, str(self.other_user.id))
+        self.assertEqual(flag.target_id, self.other_user.id)
 
     def test_citizen_reports_staff(self):
         self.other_user.is_staff = True
@@ -784,7 +784,7 @@ class UserService_Report(UserServiceTestCase):
         self.assertEqual(
             flag.target_type, ContentType.objects.get_for_model(get_user_model())
         )
-        self.assertEqual(flag.target_id, str(self.other_user.id))
+        self.assertEqual(flag.target_id, self.other_user.id)
 
     def test_staff_reports_staff(self):
         self.main_user.is_staff = True
@@ -797,7 +797,7 @@ class UserService_Report(UserServiceTestCase):
         self.assertEqual(
             flag.target_type, ContentType.objects.get_for_model(get_user_model())
         )
-        self.assertEqual(flag.target_id, str(self.other_user.id))
+        self.assertEqual(flag.target_id, self.other_user.id)
 
     def test_staff_reports_superuser(self):
         self.main_user.is_staff = True
@@ -817,7 +817,7 @@ class UserService_Report(UserServiceTestCase):
         self.assertEqual(
             flag.target_type, ContentType.objects.get_for_model(get_user_model())
         )
-        self.assertEqual(flag.target_id, str(self.other_user.id))
+        self.assertEqual(flag.target_id, self.other_user.id)
 
     def test_superuser_reports_staff(self):
         self.main_user.is_superuser = True
@@ -830,7 +830,7 @@ class UserService_Report(UserServiceTestCase):
         self.assertEqual(
             flag.target_type, ContentType.objects.get_for_model(get_user_model())
         )
-        self.assertEqual(flag.target_id, str(self.other_user.id))
+        self.assertEqual(flag.target_id, self.other_user.id)
 
     def test_superuser_reports_superuser(self):
         self.main_user.is_superuser = True
@@ -843,7 +843,7 @@ class UserService_Report(UserServiceTestCase):
         self.assertEqual(
             flag.target_type, ContentType.objects.get_for_model(get_user_model())
         )
-        self.assertEqual(flag.target_id, str(self.other_user.id))
+        self.assertEqual(flag.target_id, self.other_user.id)
 
     def test_deleted(self):
         self.other_user.delete()
@@ -888,7 +888,7 @@ class UserService_Absolve(UserServiceTestCase):
         with self.assertRaises(PermissionDenied):
             self.service.Absolve(self.request, self.grpc_context)
 
-    def test_staff_absolves_superuser(self):
+    def test_citizen_absolves_superuser(self):
         self.other_user.is_superuser = True
         self.other_user.save()
 
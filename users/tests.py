@@ -6,6 +6,8 @@ from django.db import DatabaseError
 
 from core import jwt
 from core.tests import BaseTestCase, FakeContext
+from posts.feeds import get_anonymous_feed
+from posts.pools import get_candidate_pool
 
 from .models import Connection
 
@@ -35,6 +37,8 @@ class UserContext(FakeContext):
 class BaseUserTestCase(BaseTestCase):
     def setUp(self):
         super().setUp()
+        get_candidate_pool.cache_clear()
+        get_anonymous_feed.cache_clear()
         self.main_user = get_user_model().objects.create_user(
             username="main",
             email=make_email("main"),